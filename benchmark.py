@@ -0,0 +1,491 @@
+# benchmark.py
+# Reproducible load test for the storefront and checkout flows.
+# Seeds a throwaway database, replays scripted shopping sessions and reports
+# p50/p95/p99 latency, SQL queries per request and RSS per step, then compares
+# the run against a stored baseline (benchmark_baseline.json).
+#
+# Usage:
+#   python benchmark.py                          # Flask test client, in-process
+#   python benchmark.py --target gunicorn --workers 2 --users 8
+#   python benchmark.py --target gunicorn --preset gthread --query-latency-ms 5
+#   python benchmark.py --products 500 --iterations 100 --save-baseline
+#   python benchmark.py --scenarios home,shop_filter,product
+#
+# Set --database-url to benchmark against PostgreSQL instead of a temp SQLite
+# file. The exit status is 1 when a step regresses against the baseline.
+import argparse
+import http.cookiejar
+import json
+import math
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+BASELINE_FILE = os.path.join(BASE_DIR, 'benchmark_baseline.json')
+
+LENGTHS = ['10"', '12"', '14"', '16"', '18"', '20"', '24"', '28"']
+TEXTURES = ['Straight', 'Bone Straight', 'Body Wave', 'Deep Wave', 'Kinky Curly', 'Water Wave']
+CATEGORIES = ['Lace Wigs', 'Hair Bundles', 'Closures', 'Frontals', '360 Wigs', 'Hair Care',
+              'Ponytails', 'Braiding Hair', 'Accessories', 'Bundle Deals']
+CUSTOMER_PASSWORD = 'benchpass'
+
+# Each iteration of a virtual user walks these steps in order
+SCENARIOS = ['home', 'about', 'contact', 'shop', 'shop_filter', 'product', 'add_to_cart', 'cart', 'checkout']
+EXPECTED_STATUS = {'add_to_cart': 302}
+
+# ========== SEED DATA ==========
+def seed_database(args):
+    """Fill an empty database with a deterministic catalog, customers and orders"""
+    from main import (app, db, init_db, hash_password, refresh_rating_summaries, rebuild_recommendations,
+                      Category, Product, ProductVariant, ProductImage, Review, Customer, Order, OrderItem)
+
+    rng = random.Random(args.seed)
+    now = time.time()
+
+    with app.app_context():
+        init_db()
+        if Product.query.filter(Product.slug.like('bench-%')).first():
+            print("↪️ Benchmark data already present, skipping seed", file=sys.stderr)
+            return
+        insert = lambda model, rows: rows and db.session.execute(model.__table__.insert(), rows)
+
+        insert(Category, [
+            {'name': f'{CATEGORIES[i % len(CATEGORIES)]} {i}', 'slug': f'bench-category-{i}',
+             'description': 'Benchmark category'}
+            for i in range(args.categories)
+        ])
+        category_ids = [c.id for c in Category.query.filter(Category.slug.like('bench-%'))]
+
+        products, variants, images, reviews = [], [], [], []
+        for i in range(args.products):
+            price = rng.randrange(20000, 400000, 500)
+            products.append({
+                'name': f'{rng.choice(TEXTURES)} {rng.choice(CATEGORIES)} {i}',
+                'slug': f'bench-product-{i}',
+                'description': 'Benchmark product. ' * 20,
+                'base_price': price,
+                'compare_price': price * 1.2 if i % 3 == 0 else None,
+                'sku': f'BENCH-{i:06d}',
+                'total_quantity': 1000 * args.variants,
+                'featured': i % 10 == 0,
+                'active': True,
+                'category_id': rng.choice(category_ids),
+                'is_bundle': False,
+                'bundle_discount': 0.0,
+                'created_at': datetime_from(now - i * 60),
+            })
+        insert(Product, products)
+        product_ids = [p.id for p in Product.query.filter(Product.slug.like('bench-%')).order_by(Product.id)]
+
+        for i, product_id in enumerate(product_ids):
+            for j in range(args.variants):
+                variants.append({
+                    'product_id': product_id,
+                    'name': f'Variant {j}',
+                    'length': LENGTHS[(i + j) % len(LENGTHS)],
+                    'texture': TEXTURES[(i * 7 + j) % len(TEXTURES)],
+                    'color': 'Natural Black',
+                    'price': products[i]['base_price'] + j * 5000,
+                    'stock': 1000,
+                    'sku': f'BENCH-{i:06d}-{j:02d}',
+                    'is_default': j == 0,
+                })
+            for j in range(args.images):
+                images.append({
+                    'product_id': product_id,
+                    'image_url': f'/static/images/bench-{i}-{j}.jpg',
+                    'is_primary': j == 0,
+                    'sort_order': j,
+                })
+            for j in range(args.reviews):
+                reviews.append({
+                    'product_id': product_id,
+                    'customer_name': f'Reviewer {j}',
+                    'rating': rng.randint(3, 5),
+                    'comment': 'Great hair, very soft and full.',
+                    'verified_purchase': j % 2 == 0,
+                    'approved': True,
+                    'created_at': datetime_from(now - j * 3600),
+                })
+        insert(ProductVariant, variants)
+        insert(ProductImage, images)
+        insert(Review, reviews)
+        refresh_rating_summaries(product_ids)
+
+        password_hash = hash_password(CUSTOMER_PASSWORD)
+        insert(Customer, [
+            {'email': customer_email(k), 'password_hash': password_hash, 'first_name': 'Bench',
+             'last_name': f'Customer{k}', 'phone': f'0803{k:07d}', 'address': '1 Benchmark Road',
+             'city': 'Lagos', 'state': 'Lagos'}
+            for k in range(args.customers)
+        ])
+        customer_ids = [c.id for c in Customer.query.filter(Customer.email.like('bench-%'))]
+
+        variant_rows = db.session.query(ProductVariant.id, ProductVariant.product_id,
+                                        ProductVariant.price).all()
+        orders, order_items = [], []
+        for n in range(args.orders):
+            lines = rng.sample(variant_rows, k=min(rng.randint(1, 3), len(variant_rows)))
+            subtotal = sum(price for _, _, price in lines)
+            orders.append({
+                'order_number': f'BENCH-{n:06d}',
+                'customer_id': rng.choice(customer_ids),
+                'customer_name': 'Bench Customer',
+                'customer_email': 'bench@example.com',
+                'customer_phone': '08030000000',
+                'shipping_address': '1 Benchmark Road',
+                'shipping_city': 'Lagos',
+                'shipping_state': 'Lagos',
+                'total_amount': subtotal,
+                'shipping_amount': 0.0,
+                'final_amount': subtotal,
+                'status': rng.choice(['pending', 'processing', 'shipped', 'delivered']),
+                'created_at': datetime_from(now - n * 600),
+                'updated_at': datetime_from(now - n * 600),
+            })
+            order_items.append(lines)
+        insert(Order, orders)
+        order_ids = [o.id for o in Order.query.filter(Order.order_number.like('BENCH-%')).order_by(Order.id)]
+        insert(OrderItem, [
+            {'order_id': order_id, 'product_id': product_id, 'variant_id': variant_id,
+             'product_name': 'Benchmark product', 'quantity': 1, 'unit_price': price,
+             'total_price': price}
+            for order_id, lines in zip(order_ids, order_items)
+            for variant_id, product_id, price in lines
+        ])
+        db.session.commit()
+        rebuild_recommendations()
+
+    print(f"🌱 Seeded {args.products} products, {len(variants)} variants, {len(images)} images, "
+          f"{len(reviews)} reviews, {args.customers} customers, {args.orders} orders", file=sys.stderr)
+
+def datetime_from(timestamp):
+    from datetime import datetime
+    return datetime.utcfromtimestamp(timestamp)
+
+def customer_email(k):
+    return f'bench-{k}@example.com'
+
+def load_catalog():
+    """Product/variant pairs and filter values the scenarios pick from"""
+    from main import app, db, Product, ProductVariant
+    with app.app_context():
+        rows = db.session.query(ProductVariant.product_id, ProductVariant.id,
+                                ProductVariant.length, ProductVariant.texture)\
+            .join(Product).filter(Product.slug.like('bench-%'), ProductVariant.stock > 0).all()
+    return [tuple(row) for row in rows]
+
+# ========== SCENARIOS ==========
+def build_steps(rng, catalog, scenarios):
+    """One shopping session: (step, method, path, form data)"""
+    product_id, variant_id, length, texture = rng.choice(catalog)
+    steps = {
+        'home': ('GET', '/', None),
+        'about': ('GET', '/about', None),
+        'contact': ('GET', '/contact', None),
+        'shop': ('GET', f'/shop?page={rng.randint(1, 3)}', None),
+        'shop_filter': ('GET', '/shop?' + urllib.parse.urlencode({'length': length, 'texture': texture}), None),
+        'product': ('GET', f'/product/{product_id}', None),
+        'add_to_cart': ('POST', f'/add-to-cart/{product_id}', {'quantity': 1, 'variant_id': variant_id}),
+        'cart': ('GET', '/cart', None),
+        'checkout': ('POST', '/checkout', {
+            'name': 'Bench Customer', 'email': 'bench@example.com', 'phone': '08030000000',
+            'address': '1 Benchmark Road', 'city': 'Lagos', 'state': 'Lagos', 'area': 'Lekki',
+            'payment_method': 'bank_transfer',
+        }),
+    }
+    return [(name,) + steps[name] for name in scenarios]
+
+class TestClientSession:
+    """Drives the app in-process through the Flask test client"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        return response.status_code, response.headers.get('X-Query-Count')
+
+class HttpSession:
+    """Drives a running server over HTTP with its own cookie jar, without following redirects"""
+
+    class NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), self.NoRedirect())
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(req, timeout=60) as response:
+                response.read()
+                return response.status, response.headers.get('X-Query-Count')
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code, e.headers.get('X-Query-Count')
+
+def run_user(session, user_index, args, catalog):
+    """Log in, then replay the scenario --iterations times; returns raw samples"""
+    rng = random.Random(args.seed + user_index)
+    samples = []
+    session.request('POST', '/login', {'email': customer_email(user_index % args.customers),
+                                       'password': CUSTOMER_PASSWORD})
+    for iteration in range(args.warmup + args.iterations):
+        for name, method, path, data in build_steps(rng, catalog, args.scenarios):
+            started = time.perf_counter()
+            status, query_count = session.request(method, path, data)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if iteration >= args.warmup:
+                samples.append((name, elapsed_ms, status, query_count))
+    return samples
+
+# ========== TARGETS ==========
+def rss_kb(pid='self'):
+    """Resident set size from /proc, falling back to peak RSS for this process"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if pid == 'self' else 0
+
+def child_pids(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+def run_test_client(args, catalog):
+    from main import app
+    samples = []
+    for user in range(args.users):
+        samples.extend(run_user(TestClientSession(app), user, args, catalog))
+    return samples, {'rss_kb': rss_kb()}
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+# Wraps the repo's gunicorn.conf.py; each query sleeps first to mimic a network round trip
+LATENCY_CONFIG = """
+import os, runpy, time
+globals().update(runpy.run_path({conf!r}))
+_post_fork = post_fork
+
+def post_fork(server, worker):
+    _post_fork(server, worker)
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    delay = float(os.environ['BENCH_QUERY_LATENCY_MS']) / 1000
+    event.listen(Engine, 'before_cursor_execute', lambda *args: time.sleep(delay))
+"""
+
+def run_gunicorn(args, catalog):
+    port = free_port()
+    command = [sys.executable, '-m', 'gunicorn', 'main:app', '--bind', f'127.0.0.1:{port}',
+               '--workers', str(args.workers), '--timeout', '120']
+    env = dict(os.environ, GUNICORN_PRESET=args.preset,
+               PROMETHEUS_MULTIPROC_DIR=tempfile.mkdtemp(prefix='bench-metrics-'))
+    if args.threads:
+        env['GUNICORN_THREADS'] = str(args.threads)
+    if args.query_latency_ms:
+        config_path = os.path.join(tempfile.mkdtemp(prefix='bench-gunicorn-'), 'gunicorn.conf.py')
+        with open(config_path, 'w') as f:
+            f.write(LATENCY_CONFIG.format(conf=os.path.join(BASE_DIR, 'gunicorn.conf.py')))
+        command += ['--config', config_path]
+        env['BENCH_QUERY_LATENCY_MS'] = str(args.query_latency_ms)
+    server = subprocess.Popen(command, cwd=BASE_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        deadline = time.time() + 30
+        while True:
+            try:
+                urllib.request.urlopen(base_url + '/health', timeout=2).read()
+                break
+            except (urllib.error.URLError, ConnectionError):
+                if time.time() > deadline or server.poll() is not None:
+                    raise SystemExit("❌ gunicorn did not come up")
+                time.sleep(0.2)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.users) as pool:
+            futures = [pool.submit(run_user, HttpSession(base_url), user, args, catalog)
+                       for user in range(args.users)]
+            samples = [sample for future in futures for sample in future.result()]
+        wall_s = time.perf_counter() - started
+        workers = child_pids(server.pid)
+        extra = {
+            'rss_kb': sum(rss_kb(pid) for pid in workers) + rss_kb(server.pid),
+            'throughput_rps': round(len(samples) / wall_s, 1),
+        }
+        return samples, extra
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+# ========== REPORTING ==========
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+def summarize(samples, scenarios):
+    report = {}
+    for name in scenarios:
+        rows = [s for s in samples if s[0] == name]
+        if not rows:
+            continue
+        latencies = [elapsed for _, elapsed, _, _ in rows]
+        queries = [int(q) for _, _, _, q in rows if q is not None]
+        expected = EXPECTED_STATUS.get(name, 200)
+        report[name] = {
+            'requests': len(rows),
+            'errors': sum(1 for _, _, status, _ in rows if status != expected),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'queries': round(sum(queries) / len(queries), 2) if queries else None,
+        }
+    return report
+
+def compare(report, baseline, tolerance):
+    """Steps that got slower or issue more queries
+
+    A latency regression needs both p50 and p95 beyond the tolerance (and a 2ms
+    noise floor), so a single GC pause in the tail doesn't fail the run.
+    """
+    slower = lambda now, before: now > before * (1 + tolerance) and now - before > 2
+    regressions = []
+    for name, current in report.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if slower(current['p50_ms'], previous['p50_ms']) and slower(current['p95_ms'], previous['p95_ms']):
+            regressions.append(f"{name}: p50 {previous['p50_ms']}ms -> {current['p50_ms']}ms, "
+                               f"p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current['queries'] is not None and previous.get('queries') is not None \
+                and current['queries'] > previous['queries'] + 0.5:
+            regressions.append(f"{name}: queries {previous['queries']} -> {current['queries']}")
+        if current['errors'] > previous.get('errors', 0):
+            regressions.append(f"{name}: errors {previous.get('errors', 0)} -> {current['errors']}")
+    return regressions
+
+def print_report(label, report, extra, baseline):
+    print(f"\n{label}")
+    print(f"{'step':<14}{'reqs':>6}{'errs':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}{'Δp95':>9}")
+    for name, row in report.items():
+        previous = baseline.get('steps', {}).get(name)
+        delta = f"{(row['p95_ms'] / previous['p95_ms'] - 1) * 100:+.0f}%" if previous and previous['p95_ms'] else ''
+        queries = '' if row['queries'] is None else row['queries']
+        print(f"{name:<14}{row['requests']:>6}{row['errors']:>6}{row['p50_ms']:>10}{row['p95_ms']:>10}"
+              f"{row['p99_ms']:>10}{queries:>9}{delta:>9}")
+    for key, value in extra.items():
+        previous = baseline.get(key)
+        print(f"{key}: {value}" + (f" (baseline {previous})" if previous is not None else ''))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Storefront and checkout benchmark')
+    parser.add_argument('--target', choices=['client', 'gunicorn'], default='client')
+    parser.add_argument('--database-url', help='defaults to a fresh temporary SQLite file')
+    parser.add_argument('--categories', type=int, default=10)
+    parser.add_argument('--products', type=int, default=200)
+    parser.add_argument('--variants', type=int, default=4, help='variants per product')
+    parser.add_argument('--images', type=int, default=3, help='images per product')
+    parser.add_argument('--reviews', type=int, default=5, help='reviews per product')
+    parser.add_argument('--customers', type=int, default=50)
+    parser.add_argument('--orders', type=int, default=500)
+    parser.add_argument('--users', type=int, default=4, help='concurrent virtual users')
+    parser.add_argument('--iterations', type=int, default=25, help='sessions per virtual user')
+    parser.add_argument('--warmup', type=int, default=2, help='unmeasured sessions per virtual user')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--preset', choices=['sync', 'gthread', 'gevent'], default='sync',
+                        help='GUNICORN_PRESET worker mode (gevent needs a PostgreSQL --database-url)')
+    parser.add_argument('--threads', type=int, help='override GUNICORN_THREADS for gthread')
+    parser.add_argument('--query-latency-ms', type=float, default=0,
+                        help='sleep before every query in the workers, to mimic a remote database')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p95 slowdown (0.25 = 25%%)')
+    parser.add_argument('--output', help='write the full report as JSON')
+    args = parser.parse_args()
+    args.scenarios = [s for s in args.scenarios.split(',') if s]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+def main():
+    args = parse_args()
+
+    # Environment must be in place before main.py is imported (here and in gunicorn workers)
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + tempfile.mktemp(suffix='-bench.db')
+    os.environ['QUERY_STATS_HEADERS'] = 'true'
+    os.environ['WTF_CSRF_ENABLED'] = 'false'
+    os.environ.setdefault('LOG_LEVEL', 'ERROR')
+    # Every simulated client shares one address; the limiter would throttle the run itself
+    os.environ['RATE_LIMIT_ENABLED'] = 'false'
+
+    seed_database(args)
+    catalog = load_catalog()
+    runner = run_gunicorn if args.target == 'gunicorn' else run_test_client
+    samples, extra = runner(args, catalog)
+    report = summarize(samples, args.scenarios)
+
+    label = args.target if args.target == 'client' else \
+        f"gunicorn-{args.preset}{args.threads or ''}-w{args.workers}-u{args.users}"
+    if args.query_latency_ms:
+        label += f"-lat{args.query_latency_ms:g}ms"
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+    baseline = baselines.get(label, {})
+
+    print_report(f"📊 {label}: {args.users} users x {args.iterations} sessions, {args.products} products",
+                 report, extra, baseline)
+    result = {'steps': report, **extra}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    if args.save_baseline:
+        baselines[label] = result
+        with open(args.baseline, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\n💾 Baseline saved to {args.baseline} [{label}]")
+        return 0
+
+    if not baseline:
+        print(f"\nℹ️ No baseline for {label}; run with --save-baseline to record one")
+        return 0
+    regressions = compare(report, baseline.get('steps', {}), args.tolerance)
+    for line in regressions:
+        print(f"❌ Regression: {line}")
+    if not regressions:
+        print("\n✅ No regressions against baseline")
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
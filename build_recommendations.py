@@ -0,0 +1,30 @@
+# build_recommendations.py
+# Batch job: rebuilds the product_recommendation table from order
+# co-occurrence and shared variant attributes (see rebuild_recommendations).
+# Product pages only read the table (the web app never builds it), so run this
+# at deploy (render.yaml buildCommand) and on a schedule, e.g. nightly
+# from cron or a Render cron job with the web service's DATABASE_URL.
+# Usage:
+#   python build_recommendations.py
+#   python build_recommendations.py --per-product 20
+import argparse
+import sys
+
+from main import app, db, rebuild_recommendations, RECOMMENDATIONS_PER_PRODUCT
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Rebuild the product recommendation index')
+    parser.add_argument('--per-product', type=int, default=RECOMMENDATIONS_PER_PRODUCT,
+                        help='neighbours kept per product')
+    args = parser.parse_args()
+
+    with app.app_context():
+        try:
+            db.create_all()
+            stats = rebuild_recommendations(per_product=args.per_product)
+        except Exception as e:
+            print(f"❌ Recommendation build failed: {e}", file=sys.stderr)
+            sys.exit(1)
+
+    print(f"✅ {stats['rows']} recommendations for {stats['products']} products "
+          f"({stats['with_orders']} with order history) in {stats['seconds']}s")
@@ -0,0 +1,56 @@
+# calibrate_password_hash.py
+# Picks PASSWORD_HASH_ITERATIONS so one password hash takes about --target-ms
+# on this machine. Run it on the deploy's instance type, then set the printed
+# env vars (see render.yaml). Existing hashes are upgraded on the next login.
+# Usage:
+#   python calibrate_password_hash.py --target-ms 100
+#   python calibrate_password_hash.py --method pbkdf2:sha512 --target-ms 250
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from werkzeug.security import generate_password_hash
+
+PROBE_ITERATIONS = 20000
+ROUND_TO = 10000
+
+def median_ms(method, iterations, rounds):
+    """Median wall time of one hash with these parameters"""
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        generate_password_hash('calibration-password', method=f'{method}:{iterations}')
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description='Calibrate the password hashing cost')
+    parser.add_argument('--method', default=os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256'))
+    parser.add_argument('--target-ms', type=float, default=100)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--min-iterations', type=int, default=100000,
+                        help='never suggest less than this, however slow the CPU')
+    args = parser.parse_args()
+
+    if not args.method.startswith('pbkdf2:'):
+        sys.exit(f"❌ Only pbkdf2:<algorithm> methods are supported, got {args.method!r}")
+
+    per_iteration = median_ms(args.method, PROBE_ITERATIONS, args.rounds) / PROBE_ITERATIONS
+    iterations = max(args.min_iterations, round(args.target_ms / per_iteration / ROUND_TO) * ROUND_TO)
+    measured = median_ms(args.method, iterations, args.rounds)
+    # The probe is short enough for fixed costs to skew it; correct once at full size
+    iterations = max(args.min_iterations, round(iterations * args.target_ms / measured / ROUND_TO) * ROUND_TO)
+    measured = median_ms(args.method, iterations, args.rounds)
+
+    print(f"🔐 {args.method}: {iterations} iterations take {measured:.1f}ms (target {args.target_ms:.0f}ms)")
+    print(f"   One hashing slot per worker verifies about {1000 / measured:.1f} logins/s")
+    if iterations == args.min_iterations and measured > args.target_ms * 1.2:
+        print(f"⚠️ Clamped to --min-iterations; this CPU can't reach {args.target_ms:.0f}ms at a safe cost")
+    print()
+    print(f"PASSWORD_HASH_METHOD={args.method}")
+    print(f"PASSWORD_HASH_ITERATIONS={iterations}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# gunicorn.conf.py - loaded automatically by gunicorn from the working directory
+# Command line flags (render.yaml startCommand) still take precedence.
+import os
+import tempfile
+
+# ========== PROMETHEUS MULTIPROCESS METRICS ==========
+# Must be set before the app (and prometheus_client) is imported in the workers
+metrics_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR',
+    os.path.join(tempfile.gettempdir(), 'norahairline-metrics')
+)
+# Created here, not in on_starting: with preload_app the master imports main.py
+# (and opens the gauges' files) before on_starting runs
+os.makedirs(metrics_dir, exist_ok=True)
+
+def on_starting(server):
+    """Start every deploy without metric files left by earlier runs"""
+    for name in os.listdir(metrics_dir):
+        if name.endswith('.db'):
+            try:
+                os.remove(os.path.join(metrics_dir, name))
+            except OSError:
+                pass
+
+def child_exit(server, worker):
+    """Drop live gauges of workers that have exited"""
+    try:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+    except ImportError:
+        pass
+
+# ========== WORKER LIFECYCLE ==========
+# With GUNICORN_PRELOAD=true the app is imported once in the master and
+# shared copy-on-write; each worker then needs its own DB connections and
+# log listener thread.
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'False').lower() == 'true'
+
+def post_fork(server, worker):
+    import sys
+    if server.cfg.worker_class_str == 'gevent':
+        # Make psycopg2 yield to other greenlets while waiting on the database
+        try:
+            from psycogreen.gevent import patch_psycopg
+            patch_psycopg()
+        except ImportError as e:
+            server.log.warning("psycopg2 not patched for gevent (%s); database calls will block the worker", e)
+        if os.environ.get('DATABASE_URL', 'sqlite').startswith('sqlite'):
+            # SQLite's lock wait spins in C without yielding, so one greenlet
+            # holding the write lock can stall every other greenlet in the worker
+            server.log.warning("gevent workers are not supported with SQLite; use gthread")
+    main = sys.modules.get('main')
+    if main is not None:
+        main.reinit_after_fork()
+
+# ========== WORKER MODE ==========
+# GUNICORN_PRESET picks how a worker serves concurrent requests:
+#   sync    - one request at a time per worker process
+#   gthread - GUNICORN_THREADS threads per worker; keep DB_POOL_SIZE +
+#             DB_MAX_OVERFLOW >= threads so requests don't queue on the pool
+#   gevent  - greenlets (GUNICORN_WORKER_CONNECTIONS per worker); PostgreSQL
+#             only, needs the gevent and psycogreen packages, and pairs best
+#             with DB_PGBOUNCER
+# Workers per instance come from WEB_CONCURRENCY (read by gunicorn itself).
+WORKER_PRESETS = {
+    'sync': {'worker_class': 'sync', 'threads': 1},
+    'gthread': {'worker_class': 'gthread', 'threads': 4},
+    'gevent': {'worker_class': 'gevent', 'worker_connections': 100},
+}
+preset = WORKER_PRESETS[os.environ.get('GUNICORN_PRESET', 'sync')]
+worker_class = preset['worker_class']
+threads = int(os.environ.get('GUNICORN_THREADS', preset.get('threads', 1)))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', preset.get('worker_connections', 1000)))
+
+if worker_class == 'gevent':
+    # gevent monkey-patches in the worker; a preloaded app would keep unpatched locks and sockets
+    preload_app = False
@@ -83,21 +83,63 @@ sys.modules['gunicorn.six.moves.urllib.parse'] = SixMock.moves.urllib.parse
 print("✅ Installed gunicorn.six mock", file=sys.stderr)
 
 # ========== IMPORTS ==========
-import traceback
 from datetime import datetime, timedelta
 import random
 import string
-from functools import wraps
+from contextlib import contextmanager
+from functools import lru_cache, wraps
 import json
+import math
+import gzip
+import hashlib
+import mimetypes
 import re
+import threading
+import time
+import uuid
+import queue
+import atexit
+import bisect
+import logging
+import sqlite3
+import tempfile
+from logging.handlers import QueueHandler, QueueListener
 from werkzeug.utils import secure_filename
-
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_from_directory
+from werkzeug.local import LocalProxy
+from werkzeug.exceptions import TooManyRequests, ServiceUnavailable
+from werkzeug.middleware.proxy_fix import ProxyFix
+from jinja2 import FileSystemBytecodeCache
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_from_directory, g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session as FlaskSQLAlchemySession
 from flask_wtf.csrf import CSRFProtect, generate_csrf
 from werkzeug.security import generate_password_hash, check_password_hash
-from sqlalchemy.orm import joinedload
-from sqlalchemy import text, or_, and_, func, desc
+from sqlalchemy.orm import joinedload, selectinload, aliased
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import text, or_, and_, func, desc, update, select, case, bindparam, event, cast, BigInteger
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import NullPool
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+# Prometheus metrics are optional; /metrics reports 503 without the package
+try:
+    from prometheus_client import (Counter, Gauge, Histogram, CollectorRegistry, REGISTRY,
+                                   generate_latest, CONTENT_TYPE_LATEST, multiprocess)
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+    print("⚠️ prometheus_client not installed, /metrics disabled", file=sys.stderr)
+
+# Brotli is optional; without it responses and static files fall back to gzip
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
 
 # ========== SQLALCHEMY COMPATIBILITY PATCH ==========
 # Apply TypingOnly patch after SQLAlchemy is imported
@@ -117,6 +159,134 @@ try:
 except Exception as e:
     print(f"⚠️ SQLAlchemy patch warning: {e}", file=sys.stderr)
 
+# ========== LOGGING ==========
+# Records are formatted as JSON (LOG_FORMAT=json|text) and handed to a queue;
+# a background listener thread does the actual write, so request threads never
+# block on stderr. Per-logger levels: LOG_LEVELS="nora.uploads=WARNING,...".
+# Per-logger sampling of sub-WARNING records: LOG_SAMPLE_RATES="nora.http=0.1".
+
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per line"""
+    CONTEXT_FIELDS = ('request_id', 'endpoint', 'method', 'path', 'status',
+                      'latency_ms', 'customer_id', 'admin_id')
+
+    def format(self, record):
+        payload = {
+            'ts': datetime.utcfromtimestamp(record.created).isoformat(timespec='milliseconds') + 'Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for field in self.CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                payload[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload['exc'] = record.exc_text
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def prepare(self, record):
+        # Render message and traceback now; the listener runs in another thread
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+class RequestContextFilter(logging.Filter):
+    """Attach request ID, endpoint and user IDs to records logged inside a request"""
+
+    def filter(self, record):
+        record.request_id = None
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            record.endpoint = request.endpoint
+            record.method = request.method
+            record.path = request.path
+            record.customer_id = session.get('customer_id')
+            record.admin_id = session.get('admin_id')
+        return True
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of sub-WARNING records for configured loggers"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+        self._resolved = {}
+
+    def rate_for(self, name):
+        if name not in self._resolved:
+            matches = [prefix for prefix in self.rates if name == prefix or name.startswith(prefix + '.')]
+            self._resolved[name] = self.rates[max(matches, key=len)] if matches else 1.0
+        return self._resolved[name]
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+def parse_log_settings(value):
+    """Parse "name=value,name=value" into a dict"""
+    settings = {}
+    for part in (value or '').split(','):
+        if '=' in part:
+            name, setting = part.split('=', 1)
+            settings[name.strip()] = setting.strip()
+    return settings
+
+def configure_logging():
+    """Install the queue handler on the 'nora' logger tree"""
+    log_format = os.environ.get('LOG_FORMAT', 'json').lower()
+    stream_handler = logging.StreamHandler(sys.stderr)
+    if log_format == 'json':
+        stream_handler.setFormatter(JsonLogFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter(
+            '%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s'))
+
+    log_queue = queue.Queue(maxsize=int(os.environ.get('LOG_QUEUE_SIZE', 10000)))
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    sample_rates = {name: float(rate) for name, rate in parse_log_settings(os.environ.get('LOG_SAMPLE_RATES')).items()}
+    queue_handler.addFilter(SamplingFilter(sample_rates))
+    queue_handler.addFilter(RequestContextFilter())
+
+    root_logger = logging.getLogger('nora')
+    root_logger.handlers = [queue_handler]
+    root_logger.setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
+    root_logger.propagate = False
+    for name, level in parse_log_settings(os.environ.get('LOG_LEVELS')).items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    listener = QueueListener(log_queue, stream_handler)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+LOG_LISTENER = configure_logging()
+logger = logging.getLogger('nora.app')
+http_logger = logging.getLogger('nora.http')
+db_logger = logging.getLogger('nora.db')
+query_logger = logging.getLogger('nora.queries')
+upload_logger = logging.getLogger('nora.uploads')
+auth_logger = logging.getLogger('nora.auth')
+checkout_logger = logging.getLogger('nora.checkout')
+admin_logger = logging.getLogger('nora.admin')
+catalog_logger = logging.getLogger('nora.catalog')
+
 # ========== CREATE APP ==========
 app = Flask(__name__)
 
@@ -129,27 +299,157 @@ database_url = os.environ.get('DATABASE_URL')
 if not database_url:
     # Local development - use SQLite
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///norahairline.db'
-    print("✅ Using SQLite database (local development)", file=sys.stderr)
+    db_logger.info("Using SQLite database (local development)")
 elif database_url.startswith('postgres://'):
     # Fix Render/Heroku PostgreSQL URLs
     fixed_url = database_url.replace('postgres://', 'postgresql://', 1)
     app.config['SQLALCHEMY_DATABASE_URI'] = fixed_url
-    print("✅ Using PostgreSQL database (production)", file=sys.stderr)
+    db_logger.info("Using PostgreSQL database (production)")
 else:
     # Already correct URL
     app.config['SQLALCHEMY_DATABASE_URI'] = database_url
-    print("✅ Using database from environment", file=sys.stderr)
+    db_logger.info("Using database from environment")
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=24)
-app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-    'pool_recycle': 300,
-    'pool_pre_ping': True,
-}
+
+# Connection pool: per gunicorn worker, so the database sees up to
+# workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections. DB_PGBOUNCER=true
+# hands pooling to PgBouncer (transaction mode) and keeps no local pool.
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 5))
+app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 5))
+app.config['DB_POOL_TIMEOUT'] = int(os.environ.get('DB_POOL_TIMEOUT', 10))
+app.config['DB_POOL_RECYCLE'] = int(os.environ.get('DB_POOL_RECYCLE', 300))
+app.config['DB_POOL_PRE_PING'] = os.environ.get('DB_POOL_PRE_PING', 'False').lower() == 'true'
+app.config['DB_STATEMENT_TIMEOUT_MS'] = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))
+app.config['DB_CONNECT_TIMEOUT'] = int(os.environ.get('DB_CONNECT_TIMEOUT', 10))
+app.config['DB_PGBOUNCER'] = os.environ.get('DB_PGBOUNCER', 'False').lower() == 'true'
+
+def build_engine_options(database_uri):
+    """SQLAlchemy engine options for the configured database"""
+    if database_uri.startswith('sqlite'):
+        # File databases get a NullPool; WAL pragmas are set on connect and the
+        # statement timeout becomes the lock wait
+        return {'connect_args': {'timeout': app.config['DB_STATEMENT_TIMEOUT_MS'] / 1000}}
+
+    options = {
+        'pool_pre_ping': app.config['DB_POOL_PRE_PING'],
+        'connect_args': {'connect_timeout': app.config['DB_CONNECT_TIMEOUT']},
+    }
+    if app.config['DB_PGBOUNCER']:
+        # Startup options are rejected by PgBouncer; the timeout is SET LOCAL per transaction
+        options['poolclass'] = NullPool
+    else:
+        options.update({
+            'pool_size': app.config['DB_POOL_SIZE'],
+            'max_overflow': app.config['DB_MAX_OVERFLOW'],
+            'pool_timeout': app.config['DB_POOL_TIMEOUT'],
+            'pool_recycle': app.config['DB_POOL_RECYCLE'],
+        })
+        if database_uri.startswith('postgresql'):
+            options['connect_args']['options'] = f"-c statement_timeout={app.config['DB_STATEMENT_TIMEOUT_MS']}"
+    return options
+
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = build_engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+
+# Optional read replica for catalog pages and admin reports (see @read_replica).
+# After a write, that client stays on the primary for REPLICA_STICKY_SECONDS.
+replica_url = os.environ.get('REPLICA_DATABASE_URL', '').replace('postgres://', 'postgresql://', 1)
+app.config['REPLICA_STICKY_SECONDS'] = int(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+if replica_url:
+    app.config['SQLALCHEMY_BINDS'] = {'replica': {'url': replica_url, **build_engine_options(replica_url)}}
+    db_logger.info("Read replica enabled")
+
+# Password hashing policy (see PASSWORD HASHING). Stored hashes with other
+# parameters are upgraded on the next successful login. Calibrate the cost
+# for the deploy's CPU with calibrate_password_hash.py.
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256')
+app.config['PASSWORD_HASH_ITERATIONS'] = int(os.environ.get('PASSWORD_HASH_ITERATIONS', 260000))
+# Hashes computed at once per worker, and how long a login waits for a slot.
+# A hash takes ~0.1s at the default cost, so the wait covers a few logins
+# queued ahead; longer than that a waiting login just holds a worker thread
+# and is shed with a 503 instead.
+app.config['PASSWORD_HASH_CONCURRENCY'] = int(os.environ.get('PASSWORD_HASH_CONCURRENCY', 1))
+app.config['PASSWORD_HASH_WAIT_SECONDS'] = float(os.environ.get('PASSWORD_HASH_WAIT_SECONDS', 0.5))
+
+# Rate limiting (see RATE LIMITING). Buckets live in a SQLite file that every
+# worker on the host shares. PROXY_HOPS is the number of proxies in front of
+# gunicorn whose X-Forwarded-For can be trusted; without it every client
+# shares the proxy's address.
+app.config['RATE_LIMIT_ENABLED'] = os.environ.get('RATE_LIMIT_ENABLED', 'True').lower() == 'true'
+app.config['RATE_LIMIT_DB'] = os.environ.get('RATE_LIMIT_DB', os.path.join(tempfile.gettempdir(), 'norahairline-ratelimit.sqlite'))
+app.config['PROXY_HOPS'] = int(os.environ.get('PROXY_HOPS', 0))
+if app.config['PROXY_HOPS']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_HOPS'], x_proto=app.config['PROXY_HOPS'])
+
+# Product pages are cached per worker and keyed by the catalog version (see
+# CACHING); each worker re-reads the version at most this often, so writes
+# made through other workers show up within this many seconds.
+app.config['CATALOG_VERSION_TTL'] = float(os.environ.get('CATALOG_VERSION_TTL', 2))
+# Checkout stock decrements don't move the version (see quiet_catalog_write),
+# so a cached product page may show stock this many seconds old; checkout
+# itself always checks live stock.
+app.config['PRODUCT_DETAIL_STOCK_TTL'] = float(os.environ.get('PRODUCT_DETAIL_STOCK_TTL', 30))
+app.config['PRODUCT_DETAIL_CACHE_SIZE'] = int(os.environ.get('PRODUCT_DETAIL_CACHE_SIZE', 1000))
 
 # ========== CSRF PROTECTION ==========
+app.config['WTF_CSRF_ENABLED'] = os.environ.get('WTF_CSRF_ENABLED', 'True').lower() == 'true'
 csrf = CSRFProtect(app)
 
+# ========== TEMPLATES ==========
+# Production template mode (TEMPLATE_OPTIMIZE, default on unless FLASK_DEBUG):
+# no filesystem re-checks, trim/lstrip_blocks, indentation stripped at compile
+# time, and compiled bytecode shared by all workers through TEMPLATE_CACHE_DIR
+# (filled at deploy time by precompile_templates.py).
+FLASK_DEBUG = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
+app.config['TEMPLATE_OPTIMIZE'] = os.environ.get('TEMPLATE_OPTIMIZE', str(not FLASK_DEBUG)).lower() == 'true'
+app.config['TEMPLATE_CACHE_DIR'] = os.environ.get(
+    'TEMPLATE_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.jinja_cache'))
+# Bump when HtmlWhitespaceMinifier changes, so stale bytecode isn't reused
+TEMPLATE_CACHE_VERSION = 3
+
+# Whitespace inside these is content (preformatted text, inline JS/CSS strings)
+PROTECTED_HTML = re.compile(r'<(pre|textarea|script|style)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+BLOCK_TAG = re.compile(r'\{%([+-]?)(.*?)([+-]?)%\}', re.DOTALL)
+
+def keep_block_whitespace(source):
+    """Write block tags as {%+ ... +%} so lstrip_blocks and trim_blocks leave the text around them alone"""
+    return BLOCK_TAG.sub(lambda m: f"{{%{m.group(1) or '+'}{m.group(2)}{m.group(3) or '+'}%}}", source)
+
+def collapse_indentation(source):
+    """Drop indentation and trailing spaces, keeping line breaks"""
+    source = re.sub(r'[ \t]*\r?\n[ \t]*', '\n', source)
+    # trim_blocks removes the newline after a block tag. Before a tag a space
+    # is enough to keep "checked{% endif %}" and what follows apart; anywhere
+    # else double the newline so the rendered text keeps its line break
+    source = re.sub(r'(?<!-)%\}\n(?=<)', '%}\n ', source)
+    return re.sub(r'(?<!-)%\}\n(?![ <])', '%}\n\n', source)
+
+class HtmlWhitespaceMinifier(Extension):
+    """Jinja preprocessor that strips HTML template whitespace once, at compile time"""
+
+    def preprocess(self, source, name, filename=None):
+        if not name or not name.endswith('.html'):
+            return source
+        parts, position = [], 0
+        for match in PROTECTED_HTML.finditer(source):
+            parts.append(collapse_indentation(source[position:match.start()]))
+            parts.append(keep_block_whitespace(match.group(0)))
+            position = match.end()
+        parts.append(collapse_indentation(source[position:]))
+        return ''.join(parts)
+
+app.templates_auto_reload = FLASK_DEBUG
+if app.config['TEMPLATE_OPTIMIZE']:
+    app.jinja_env.trim_blocks = True
+    app.jinja_env.lstrip_blocks = True
+    app.jinja_env.add_extension(HtmlWhitespaceMinifier)
+    template_cache_dir = os.path.join(app.config['TEMPLATE_CACHE_DIR'], f'optimized-{TEMPLATE_CACHE_VERSION}')
+else:
+    template_cache_dir = os.path.join(app.config['TEMPLATE_CACHE_DIR'], 'plain')
+os.makedirs(template_cache_dir, exist_ok=True)
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(template_cache_dir)
+
 # ========== UPLOAD FOLDER CONFIG ==========
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOAD_FOLDER = os.path.join(BASE_DIR, 'static', 'uploads')
@@ -157,19 +457,156 @@ UPLOAD_FOLDER = os.path.join(BASE_DIR, 'static', 'uploads')
 # Create folder immediately
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-    print(f"✅ Created uploads folder: {UPLOAD_FOLDER}", file=sys.stderr)
+    upload_logger.info("Created uploads folder: %s", UPLOAD_FOLDER)
 else:
-    print(f"✅ Uploads folder exists: {UPLOAD_FOLDER}", file=sys.stderr)
+    upload_logger.info("Uploads folder exists: %s", UPLOAD_FOLDER)
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+
+# Query instrumentation
+app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 200))
+app.config['N_PLUS_ONE_THRESHOLD'] = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 10))
+app.config['QUERY_STATS_HEADERS'] = os.environ.get('QUERY_STATS_HEADERS', os.environ.get('FLASK_DEBUG', 'False')).lower() == 'true'
+
+# Bearer token required by /metrics; without one the endpoint is only served
+# in debug (FLASK_DEBUG) and answers 404 otherwise
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN', '')
+
+# Response compression (see COMPRESSION below)
+app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+app.config['COMPRESS_GZIP_LEVEL'] = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
+app.config['COMPRESS_BR_QUALITY'] = int(os.environ.get('COMPRESS_BR_QUALITY', 5))
 # ========== END CONFIG ==========
 
 # Allowed upload extensions
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 
 # ========== INITIALIZE EXTENSIONS ==========
-db = SQLAlchemy(app)
+class RoutingSession(FlaskSQLAlchemySession):
+    """Sends reads to the replica inside @read_replica views; flushes and DML stay on the primary"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not getattr(clause, 'is_dml', False) \
+                and has_request_context() and g.get('use_replica'):
+            return self._db.engines['replica']
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+
+# ========== DATABASE ENGINE ==========
+@event.listens_for(Engine, 'connect')
+def configure_sqlite_connection(dbapi_connection, connection_record):
+    """WAL lets readers run alongside the checkout writer; NORMAL sync is safe under WAL"""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+
+@event.listens_for(Engine, 'begin')
+def set_transaction_statement_timeout(conn):
+    """Statement timeout under PgBouncer transaction pooling, where session settings don't stick"""
+    if app.config['DB_PGBOUNCER'] and conn.dialect.name == 'postgresql':
+        # Raw cursor: executing through conn here would re-enter begin
+        cursor = conn.connection.cursor()
+        cursor.execute(f"SET LOCAL statement_timeout = {app.config['DB_STATEMENT_TIMEOUT_MS']}")
+        cursor.close()
+
+def read_replica(f):
+    """Serve this view's queries from the replica, unless the client wrote recently"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'replica' in app.config.get('SQLALCHEMY_BINDS', {}) \
+                and session.get('db_primary_until', 0) < time.time():
+            g.use_replica = True
+        return f(*args, **kwargs)
+    return decorated_function
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def note_database_write(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and (context.isinsert or context.isupdate or context.isdelete) \
+            and has_request_context():
+        g.db_wrote = True
+
+@app.after_request
+def stick_to_primary_after_write(response):
+    """Read-your-writes: keep a client that just wrote off the (possibly lagging) replica"""
+    if g.get('db_wrote') and 'replica' in app.config.get('SQLALCHEMY_BINDS', {}):
+        session['db_primary_until'] = time.time() + app.config['REPLICA_STICKY_SECONDS']
+    return response
+
+def reinit_after_fork():
+    """Called from gunicorn's post_fork: drop pooled connections and threads inherited from the master"""
+    global LOG_LISTENER
+    LOG_LISTENER = configure_logging()
+    with app.app_context():
+        for engine in db.engines.values():
+            # close=False: the parent still owns those sockets
+            engine.dispose(close=False)
+
+# ========== PASSWORD HASHING ==========
+class PasswordHashBusy(Exception):
+    """No hashing slot freed up within PASSWORD_HASH_WAIT_SECONDS"""
+
+def password_hash_method(method=None, iterations=None):
+    """Werkzeug method string for the policy, e.g. 'pbkdf2:sha256:260000'"""
+    method = method or app.config['PASSWORD_HASH_METHOD']
+    iterations = iterations or app.config['PASSWORD_HASH_ITERATIONS']
+    algorithm = method.split(':', 1)[1] if method.startswith('pbkdf2:') else None
+    if algorithm not in hashlib.algorithms_available:
+        raise ValueError(f"PASSWORD_HASH_METHOD must be pbkdf2:<hashlib algorithm>, got {method!r}")
+    return f"{method}:{iterations}"
+
+PASSWORD_HASH_METHOD = password_hash_method()
+
+# Hashing is deliberately CPU-heavy. Capping it per worker keeps a burst of
+# logins from occupying every thread while catalog requests queue behind it.
+PASSWORD_HASH_SLOTS = threading.BoundedSemaphore(app.config['PASSWORD_HASH_CONCURRENCY'])
+
+@contextmanager
+def password_hash_slot(operation):
+    if not PASSWORD_HASH_SLOTS.acquire(timeout=app.config['PASSWORD_HASH_WAIT_SECONDS']):
+        record_password_hash(operation, None)
+        raise PasswordHashBusy()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        PASSWORD_HASH_SLOTS.release()
+        record_password_hash(operation, time.perf_counter() - started)
+
+def hash_password(password):
+    with password_hash_slot('hash'):
+        return generate_password_hash(password, method=PASSWORD_HASH_METHOD)
+
+def verify_password(password_hash, password):
+    with password_hash_slot('verify'):
+        return check_password_hash(password_hash, password)
+
+def password_needs_rehash(password_hash):
+    """True if the stored hash was made with another method or cost"""
+    return (password_hash or '').split('$', 1)[0] != PASSWORD_HASH_METHOD
+
+def upgrade_password_hash(account, password):
+    """Re-hash a verified password with the current policy, unless no slot is free"""
+    try:
+        account.set_password(password)
+    except PasswordHashBusy:
+        # The password was right; don't fail the login over the upgrade,
+        # it is retried on the next one
+        auth_logger.info("Password rehash skipped for %s %s: hashing busy", type(account).__name__, account.id)
+
+def commit_password_rehash(account):
+    """Persist a hash upgraded by check_password(); the login goes ahead if this fails"""
+    if not db.session.is_modified(account):
+        return
+    try:
+        db.session.commit()
+        auth_logger.info("Password hash upgraded for %s %s", type(account).__name__, account.id)
+    except Exception as e:
+        db.session.rollback()
+        auth_logger.warning("Password rehash not saved for %s %s: %s", type(account).__name__, account.id, e)
 
 # ========== DATABASE MODELS ==========
 class User(db.Model):
@@ -183,10 +620,15 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        """Verify, upgrading an outdated hash in place (see commit_password_rehash)"""
+        if not verify_password(self.password_hash, password):
+            return False
+        if password_needs_rehash(self.password_hash):
+            upgrade_password_hash(self, password)
+        return True
 
     def __repr__(self):
         return f'<User {self.username}>'
@@ -225,6 +667,7 @@ class Product(db.Model):
     category = db.relationship('Category', backref='products', lazy='joined')
     variants = db.relationship('ProductVariant', backref='product', lazy=True, cascade='all, delete-orphan')
     images = db.relationship('ProductImage', backref='product', lazy=True, cascade='all, delete-orphan')
+    rating_summary = db.relationship('ProductRatingSummary', uselist=False, lazy=True, cascade='all, delete-orphan')
 
     @property
     def stock(self):
@@ -341,10 +784,15 @@ class Customer(db.Model):
     orders = db.relationship('Order', backref='customer', lazy=True)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        """Verify, upgrading an outdated hash in place (see commit_password_rehash)"""
+        if not verify_password(self.password_hash, password):
+            return False
+        if password_needs_rehash(self.password_hash):
+            upgrade_password_hash(self, password)
+        return True
 
     def __repr__(self):
         return f'<Customer {self.email}>'
@@ -415,6 +863,92 @@ class Review(db.Model):
     def __repr__(self):
         return f'<Review {self.id}>'
 
+class ProductRatingSummary(db.Model):
+    """Approved-review aggregates per product, kept by refresh_rating_summaries"""
+    __tablename__ = 'product_rating_summary'
+
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    review_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_total = db.Column(db.Integer, nullable=False, default=0)
+    average_rating = db.Column(db.Float, nullable=False, default=0.0)
+    stars_1 = db.Column(db.Integer, nullable=False, default=0)
+    stars_2 = db.Column(db.Integer, nullable=False, default=0)
+    stars_3 = db.Column(db.Integer, nullable=False, default=0)
+    stars_4 = db.Column(db.Integer, nullable=False, default=0)
+    stars_5 = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @property
+    def histogram(self):
+        """(stars, count, percent of reviews) from 5 stars down to 1"""
+        return [(stars, count, round(100 * count / self.review_count) if self.review_count else 0)
+                for stars, count in ((stars, getattr(self, f'stars_{stars}')) for stars in range(5, 0, -1))]
+
+    def __repr__(self):
+        return f'<ProductRatingSummary {self.product_id}: {self.average_rating} x{self.review_count}>'
+
+class ProductRecommendation(db.Model):
+    """Precomputed top-k neighbours per product, rebuilt by rebuild_recommendations"""
+    __tablename__ = 'product_recommendation'
+
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    related_product_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    reason = db.Column(db.String(20), nullable=False)
+    built_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ProductRecommendation {self.product_id}#{self.rank} -> {self.related_product_id}>'
+
+class SequenceCounter(db.Model):
+    """Counter rows standing in for DB sequences on SQLite"""
+    __tablename__ = 'sequence_counter'
+
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<SequenceCounter {self.name}={self.value}>'
+
+class DeliveryRates(db.Model):
+    """The delivery rate table as a versioned JSON document (see DeliveryPricing)"""
+    __tablename__ = 'delivery_rates'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    rules = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<DeliveryRates v{self.version}>'
+
+# Indexes added after the original tables were created (see init_db).
+# Case-insensitive exact and prefix lookups: slug-N scans, admin customer search.
+LOOKUP_INDEXES = [
+    db.Index('idx_product_slug_lower', func.lower(Product.slug).label('slug_lower'),
+             postgresql_ops={'slug_lower': 'text_pattern_ops'}),
+    db.Index('idx_category_slug_lower', func.lower(Category.slug).label('slug_lower'),
+             postgresql_ops={'slug_lower': 'text_pattern_ops'}),
+    db.Index('idx_customer_email_lower', func.lower(Customer.email).label('email_lower'),
+             postgresql_ops={'email_lower': 'text_pattern_ops'}),
+    db.Index('idx_customer_first_name_lower', func.lower(Customer.first_name).label('first_name_lower'),
+             postgresql_ops={'first_name_lower': 'text_pattern_ops'}),
+    db.Index('idx_customer_last_name_lower', func.lower(Customer.last_name).label('last_name_lower'),
+             postgresql_ops={'last_name_lower': 'text_pattern_ops'}),
+    db.Index('idx_customer_phone', Customer.phone,
+             postgresql_ops={'phone': 'text_pattern_ops'}),
+    db.Index('idx_order_customer_created', Order.customer_id, Order.created_at),
+    db.Index('idx_order_item_order', OrderItem.order_id),
+    # Keyset pages of a product's approved reviews, newest first; homepage testimonials
+    db.Index('idx_review_product_feed', Review.product_id, Review.approved, Review.created_at, Review.id),
+    db.Index('idx_review_approved_created', Review.approved, Review.created_at),
+]
+
+# Real sequences on PostgreSQL; SequenceCounter rows elsewhere
+SKU_SEQUENCE = db.Sequence('product_sku_seq', metadata=db.Model.metadata)
+ORDER_NUMBER_SEQUENCE = db.Sequence('order_number_seq', metadata=db.Model.metadata)
+
 # ========== BUSINESS CONFIGURATION ==========
 BUSINESS_CONFIG = {
     'brand_name': 'NORA HAIR LINE',
@@ -435,19 +969,151 @@ BUSINESS_CONFIG = {
     'payment_name': 'CHUKWUNEKE CHIAMAKA',
     'year': datetime.now().year,
     'site_logo': 'logo.png',
-    'delivery_rates': {
-        'lagos_mainland': 3000,
-        'lagos_island': 3500,
-        'other_states': 5000,
-        'express': 8000
-    },
     'free_delivery_threshold': 150000,
-    'delivery_areas': {
-        'lagos': ['ikeja', 'vi', 'lekki', 'ikoyi', 'surulere', 'yaba', 'ajah', 'apapa', 'festac', 'ojo', 'badagry'],
-        'express': ['same_day', 'next_day']
-    }
 }
 
+# Seed for the delivery_rates table; admins edit the live copy at /admin/delivery.
+#   zones:  fee per zone, optional quantity tiers and a zone-specific free_over
+#   states: default zone per state, area -> zone overrides and area spellings
+#   default_zone: anywhere not listed under states
+DEFAULT_DELIVERY_RATES = {
+    'default_zone': 'other_states',
+    'zones': {
+        'lagos_mainland': {'label': 'Lagos Mainland', 'fee': 3000},
+        'lagos_island': {'label': 'Lagos Island', 'fee': 3500},
+        'other_states': {'label': 'Other States', 'fee': 5000},
+    },
+    'states': {
+        'lagos': {
+            'zone': 'lagos_mainland',
+            'areas': {
+                'ikeja': 'lagos_mainland',
+                'victoria island': 'lagos_island',
+                'lekki': 'lagos_island',
+                'ikoyi': 'lagos_island',
+                'surulere': 'lagos_mainland',
+                'yaba': 'lagos_mainland',
+                'ajah': 'lagos_island',
+                'apapa': 'lagos_mainland',
+                'festac': 'lagos_mainland',
+                'ojo': 'lagos_mainland',
+                'badagry': 'lagos_mainland',
+            },
+            'aliases': {'vi': 'victoria island'},
+        },
+    },
+}
+
+# ========== CACHING ==========
+class SimpleCache:
+    """Small thread-safe in-process TTL cache (one per worker)"""
+
+    def __init__(self, name, ttl=300, max_size=1000):
+        self.name = name
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                record_cache_lookup(self.name, hit=True)
+                return entry[1]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            record_cache_lookup(self.name, hit=False)
+            return default
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            if key not in self._data and len(self._data) >= self.max_size:
+                # Drop the oldest entry
+                self._data.pop(next(iter(self._data)))
+            self._data[key] = (time.monotonic() + (ttl or self.ttl), value)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def get_or_set(self, key, factory, ttl=None):
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = factory()
+            self.set(key, value, ttl)
+        return value
+
+# Keyed on the customer's live order stamp (see account_order_stamp), so an
+# order placed or changed through any worker misses the old entry
+ACCOUNT_SUMMARY_CACHE = SimpleCache('account_summary', ttl=300, max_size=5000)
+# Compiled delivery rate table; dropped on admin edits, other workers pick it up within the TTL
+DELIVERY_RATES_CACHE = SimpleCache('delivery_rates', ttl=60, max_size=1)
+# Product page snapshots as (catalog version, detail); the TTL bounds how stale checkout-driven stock can be
+PRODUCT_DETAIL_CACHE = SimpleCache('product_detail', ttl=app.config['PRODUCT_DETAIL_STOCK_TTL'],
+                                   max_size=app.config['PRODUCT_DETAIL_CACHE_SIZE'])
+CATALOG_VERSION_CACHE = SimpleCache('catalog_version', ttl=app.config['CATALOG_VERSION_TTL'], max_size=1)
+
+# The catalog version is a counter row bumped in the same transaction as any
+# write to these tables, ORM flush or Core statement alike, just before commit.
+# Reviews aren't listed: pending ones aren't rendered, and approving or
+# deleting an approved one rewrites its product_rating_summary row.
+CATALOG_TABLES = {'product', 'product_variant', 'product_image', 'category',
+                  'product_rating_summary', 'product_recommendation'}
+CATALOG_VERSION_KEY = 'catalog_version'
+catalog_commit_state = threading.local()
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def note_catalog_write(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and (context.isinsert or context.isupdate or context.isdelete):
+        table = getattr(getattr(context.compiled, 'statement', None), 'table', None)
+        if getattr(table, 'name', None) in CATALOG_TABLES:
+            conn.info['catalog_changed'] = True
+
+def quiet_catalog_write():
+    """Keep this transaction's catalog writes from moving the version (checkout stock decrements)"""
+    db.session.connection().info['catalog_quiet'] = True
+
+@event.listens_for(Engine, 'commit')
+def bump_catalog_version(conn):
+    changed = conn.info.pop('catalog_changed', False)
+    quiet = conn.info.pop('catalog_quiet', False)
+    if changed and not quiet:
+        # Raw cursor, so the statement doesn't run back through these hooks mid-commit
+        cursor = conn.connection.cursor()
+        cursor.execute(f"UPDATE sequence_counter SET value = value + 1 WHERE name = '{CATALOG_VERSION_KEY}'")
+        cursor.close()
+        # This runs before the DBAPI commit; the cached version is dropped in
+        # clear_catalog_version so no thread re-caches the old value meanwhile
+        catalog_commit_state.bumped = True
+
+@event.listens_for(RoutingSession, 'after_commit')
+def clear_catalog_version(session):
+    if getattr(catalog_commit_state, 'bumped', False):
+        catalog_commit_state.bumped = False
+        CATALOG_VERSION_CACHE.clear()
+
+@event.listens_for(Engine, 'rollback')
+def forget_catalog_write(conn):
+    conn.info.pop('catalog_changed', None)
+    conn.info.pop('catalog_quiet', None)
+    catalog_commit_state.bumped = False
+
+def catalog_version():
+    """Current catalog version, re-read at most every CATALOG_VERSION_TTL seconds"""
+    return CATALOG_VERSION_CACHE.get_or_set('version', lambda: db.session.execute(
+        select(SequenceCounter.value).where(SequenceCounter.name == CATALOG_VERSION_KEY)
+    ).scalar() or 0)
+
 # ========== HELPER FUNCTIONS ==========
 def format_price(value):
     """Safely format price value"""
@@ -460,10 +1126,44 @@ def format_price(value):
     except (ValueError, TypeError):
         return "₦0.00"
 
+ORDER_NUMBER_PATTERN = re.compile(r'^NORA-(\d{6,})(\d)$')
+
+def luhn_check_digit(digits):
+    """Luhn check digit for a string of digits"""
+    total = 0
+    for i, ch in enumerate(reversed(digits)):
+        n = int(ch)
+        if i % 2 == 0:
+            n *= 2
+            if n > 9:
+                n -= 9
+        total += n
+    return str((10 - total % 10) % 10)
+
 def generate_order_number():
-    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-    random_str = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-    return f'NORA-{timestamp}-{random_str}'
+    """Short, monotonic order number with a Luhn check digit, e.g. NORA-0001234"""
+    body = f"{next_sequence_value(ORDER_NUMBER_SEQUENCE):06d}"
+    return f'NORA-{body}{luhn_check_digit(body)}'
+
+def normalize_order_number(value):
+    """Canonical order number from user input, or None if it can't be valid
+
+    Accepts "#nora-0001234", "0001234" etc. Numbers in the new format are
+    rejected on a bad check digit without touching the database; legacy
+    timestamp numbers are passed through as-is.
+    """
+    value = (value or '').strip().upper().lstrip('#')
+    if not value:
+        return None
+    if value.isdigit():
+        value = f'NORA-{value}'
+
+    match = ORDER_NUMBER_PATTERN.match(value)
+    if match and luhn_check_digit(match.group(1)) != match.group(2):
+        return None
+    if not match and not value.startswith('NORA-'):
+        return None
+    return value
 
 def calculate_cart_with_variants():
     """Calculate cart total with variant-specific pricing"""
@@ -475,29 +1175,221 @@ def calculate_cart_with_variants():
             total += float(variant_price) * quantity
     return total
 
+def account_orders_query(customer_id):
+    """Order rows for a customer with line item counts, newest first"""
+    item_count = select(func.count(OrderItem.id))\
+        .where(OrderItem.order_id == Order.id)\
+        .scalar_subquery()
+    return db.session.query(
+        Order.id,
+        Order.order_number,
+        Order.created_at,
+        Order.final_amount,
+        Order.status,
+        Order.payment_status,
+        item_count.label('item_count')
+    ).filter(Order.customer_id == customer_id)\
+        .order_by(Order.created_at.desc(), Order.id.desc())
+
+def account_order_stamp(customer_id):
+    """(order count, latest order change) for a customer, read live"""
+    count, updated = db.session.query(func.count(Order.id), func.max(Order.updated_at))\
+        .filter(Order.customer_id == customer_id)\
+        .one()
+    return count, updated
+
+def get_account_summary(customer_id, stamp):
+    """Order counts, spend and the 3 most recent orders for the account header (cached per stamp)"""
+    def load():
+        totals = db.session.query(
+            func.count(Order.id),
+            func.coalesce(func.sum(case((Order.status == 'pending', 1), else_=0)), 0),
+            func.coalesce(func.sum(case((Order.status == 'delivered', 1), else_=0)), 0),
+            func.coalesce(func.sum(Order.final_amount), 0)
+        ).filter(Order.customer_id == customer_id).one()
+
+        recent = account_orders_query(customer_id).limit(3).all()
+
+        return {
+            'total_orders': totals[0],
+            'pending_orders': int(totals[1]),
+            'delivered_orders': int(totals[2]),
+            'total_spent': float(totals[3]),
+            'recent_orders': [dict(row._mapping) for row in recent],
+        }
+
+    return ACCOUNT_SUMMARY_CACHE.get_or_set((customer_id,) + tuple(stamp), load)
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def calculate_delivery_fee(city, state, area=None, subtotal=0):
-    """Calculate delivery fee based on location"""
-    # Free delivery for orders above threshold
-    if subtotal >= BUSINESS_CONFIG['free_delivery_threshold']:
-        return 0
-
-    city_lower = city.lower() if city else ''
-    state_lower = state.lower() if state else ''
-    area_lower = area.lower() if area else ''
+LOCATION_SEPARATORS = re.compile(r'[\s_-]+')
+
+@lru_cache(maxsize=1024)
+def normalize_location(value):
+    """Lower-case and collapse separators: ' Victoria-Island' -> 'victoria island'"""
+    return LOCATION_SEPARATORS.sub(' ', str(value or '').lower()).strip()
+
+class DeliveryPricing:
+    """Delivery rate table compiled into hash lookups.
+
+    Built once from the DeliveryRates JSON document. quote() resolves the
+    state (or city) and the area with a few dict lookups, trying the full
+    area name and then its leading words ('lekki phase 1' -> 'lekki'), and
+    picks a quantity tier with a bisect. Raises ValueError for bad rules.
+    """
+
+    def __init__(self, rules, version=0):
+        self.rules = rules
+        self.version = version
+        self.zones = {}
+        self.states = {}
+        self.area_names = {}
+
+        rules = self._mapping(rules, 'rate table')
+        for name, zone in self._mapping(rules.get('zones'), 'zones').items():
+            zone = self._mapping(zone, f'zone {name!r}')
+            tiers = sorted((self._quantity(name, tier.get('min_quantity')), self._amount(name, tier.get('fee')))
+                           for tier in (self._mapping(t, f'zone {name!r} tier') for t in zone.get('tiers') or []))
+            free_over = zone.get('free_over')
+            self.zones[name] = {
+                'label': zone.get('label') or name.replace('_', ' ').title(),
+                'fee': self._amount(name, zone.get('fee')),
+                'tier_quantities': [quantity for quantity, _ in tiers],
+                'tier_fees': [fee for _, fee in tiers],
+                'free_over': None if free_over is None else self._amount(name, free_over),
+            }
+        if not self.zones:
+            raise ValueError('at least one zone is required')
+
+        self.default_zone = rules.get('default_zone')
+        self._check_zone(self.default_zone, 'default_zone')
+
+        for state, region in self._mapping(rules.get('states'), 'states').items():
+            region = self._mapping(region, f'state {state!r}')
+            zone = region.get('zone', self.default_zone)
+            self._check_zone(zone, f'state {state!r}')
+            areas = {}
+            for area, area_zone in self._mapping(region.get('areas'), f'state {state!r} areas').items():
+                self._check_zone(area_zone, f'area {area!r}')
+                areas[normalize_location(area)] = area_zone
+            for alias, area in self._mapping(region.get('aliases'), f'state {state!r} aliases').items():
+                if normalize_location(area) not in areas:
+                    raise ValueError(f'alias {alias!r} points to unknown area {area!r}')
+                areas[normalize_location(alias)] = areas[normalize_location(area)]
+            self.states[normalize_location(state)] = (zone, areas)
+            self.area_names[normalize_location(state)] = list(region.get('areas') or {})
+
+    @staticmethod
+    def _mapping(value, where):
+        if value is None:
+            return {}
+        if not isinstance(value, dict):
+            raise ValueError(f'{where} must be a JSON object')
+        return value
+
+    @staticmethod
+    def _amount(zone, value):
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+            raise ValueError(f'zone {zone!r}: amounts must be non-negative numbers, got {value!r}')
+        return value
+
+    @staticmethod
+    def _quantity(zone, value):
+        if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+            raise ValueError(f'zone {zone!r}: tier min_quantity must be a positive integer, got {value!r}')
+        return value
+
+    def _check_zone(self, zone, where):
+        if zone not in self.zones:
+            raise ValueError(f'{where}: unknown zone {zone!r}')
+
+    def zone_for(self, state, area=None, city=None):
+        region = self.states.get(normalize_location(state)) or self.states.get(normalize_location(city))
+        if region is None:
+            return self.default_zone
+        zone, areas = region
+        words = normalize_location(area).split()
+        while words:
+            match = areas.get(' '.join(words))
+            if match:
+                return match
+            words.pop()
+        return zone
+
+    def quote(self, state, area=None, city=None, subtotal=0, quantity=1):
+        """Zone and fee for one destination"""
+        name = self.zone_for(state, area, city)
+        zone = self.zones[name]
+        fee = zone['fee']
+        tier = bisect.bisect_right(zone['tier_quantities'], quantity)
+        if tier:
+            fee = zone['tier_fees'][tier - 1]
+        free_over = zone['free_over']
+        if free_over is None:
+            free_over = BUSINESS_CONFIG['free_delivery_threshold']
+        if subtotal >= free_over:
+            fee = 0
+        return {'zone': name, 'label': zone['label'], 'delivery_fee': fee, 'free_over': free_over}
+
+    def areas(self, state):
+        """Area names listed for a state, aliases excluded (checkout area select)"""
+        return self.area_names.get(normalize_location(state), [])
+
+    def client_table(self):
+        """Compiled table for browsers, which quote with the same rules (checkout.html)"""
+        threshold = BUSINESS_CONFIG['free_delivery_threshold']
+        return {
+            'version': self.version,
+            'default_zone': self.default_zone,
+            'zones': {
+                name: {
+                    'label': zone['label'],
+                    'fee': zone['fee'],
+                    'tiers': [[quantity, fee] for quantity, fee in zip(zone['tier_quantities'], zone['tier_fees'])],
+                    'free_over': threshold if zone['free_over'] is None else zone['free_over'],
+                }
+                for name, zone in self.zones.items()
+            },
+            'states': {state: {'zone': zone, 'areas': areas} for state, (zone, areas) in self.states.items()},
+        }
 
-    # Check if it's Lagos
-    if state_lower == 'lagos' or city_lower == 'lagos':
-        # Check for island areas
-        island_areas = ['ikoyi', 'lekki', 'vi', 'victoria island', 'ajah']
-        if any(island_area in area_lower for island_area in island_areas):
-            return BUSINESS_CONFIG['delivery_rates']['lagos_island']
-        return BUSINESS_CONFIG['delivery_rates']['lagos_mainland']
+def load_delivery_pricing():
+    row = DeliveryRates.query.order_by(DeliveryRates.id.desc()).first()
+    if row is None:
+        return DeliveryPricing(DEFAULT_DELIVERY_RATES)
+    return DeliveryPricing(json.loads(row.rules), row.version)
 
-    # Other states
-    return BUSINESS_CONFIG['delivery_rates']['other_states']
+def get_delivery_pricing():
+    """Compiled delivery rate table (cached per worker)"""
+    pricing = DELIVERY_RATES_CACHE.get('pricing')
+    if pricing is None:
+        try:
+            pricing = load_delivery_pricing()
+        except Exception as e:
+            # Don't cache the fallback, retry the table on the next call
+            db_logger.warning("Delivery rates unavailable, using defaults: %s", e)
+            return DeliveryPricing(DEFAULT_DELIVERY_RATES)
+        DELIVERY_RATES_CACHE.set('pricing', pricing)
+    return pricing
+
+def save_delivery_rates(rules):
+    """Validate and store a new rate table, bumping its version. Raises ValueError."""
+    pricing = DeliveryPricing(rules)
+    row = DeliveryRates.query.order_by(DeliveryRates.id.desc()).first()
+    if row is None:
+        row = DeliveryRates(version=0)
+        db.session.add(row)
+    row.version = (row.version or 0) + 1
+    row.rules = json.dumps(rules)
+    db.session.commit()
+    pricing.version = row.version
+    DELIVERY_RATES_CACHE.delete('pricing')
+    return pricing
+
+def calculate_delivery_fee(city, state, area=None, subtotal=0, quantity=1):
+    """Calculate delivery fee based on location"""
+    return get_delivery_pricing().quote(state, area, city, subtotal, quantity)['delivery_fee']
 
 def check_stock_availability(product_id, variant_id=None, quantity=1):
     """Check if product/variant has sufficient stock"""
@@ -519,12 +1411,15 @@ def check_stock_availability(product_id, variant_id=None, quantity=1):
                 return False, f"Only {product.total_quantity} available"
             return True, "Available"
     except Exception as e:
-        print(f"❌ Stock check error: {str(e)}", file=sys.stderr)
+        db_logger.exception("Stock check error: %s", e)
         return False, "Error checking stock"
 
 def update_product_stock(product_id, variant_id=None, quantity_change=0):
     """Update stock after purchase"""
     try:
+        # Product pages pick the new stock up within PRODUCT_DETAIL_STOCK_TTL;
+        # bumping the catalog version would drop every cached page per order
+        quiet_catalog_write()
         if variant_id:
             variant = ProductVariant.query.get(variant_id)
             if variant:
@@ -543,49 +1438,280 @@ def update_product_stock(product_id, variant_id=None, quantity_change=0):
         return False
     except Exception as e:
         db.session.rollback()
-        print(f"❌ Update stock error: {str(e)}", file=sys.stderr)
+        db_logger.exception("Update stock error: %s", e)
         return False
 
+def parse_inventory_line(line):
+    """Parse one bulk inventory line: "<sku or #variant_id>, <stock>, <price>"
+
+    Stock may be "+5"/"-2" (delta), "=10" or "10" (absolute) or blank.
+    Price may be blank to leave it unchanged.
+    """
+    parts = [p.strip() for p in line.split(',')]
+    parts += [''] * (3 - len(parts))
+    key, stock, price = parts[0], parts[1], parts[2]
+
+    change = {}
+    if key.startswith('#'):
+        change['variant_id'] = key[1:]
+    else:
+        change['sku'] = key
+
+    if stock:
+        if stock[0] in '+-':
+            change['stock'] = stock
+            change['mode'] = 'delta'
+        else:
+            change['stock'] = stock.lstrip('=')
+            change['mode'] = 'set'
+
+    if price:
+        change['price'] = price.replace('₦', '').replace(',', '')
+
+    return change
+
+def apply_inventory_changes(changes):
+    """Apply bulk stock/price changes to variants in one transaction.
+
+    Each change is a dict with ``sku`` or ``variant_id``, an optional
+    ``stock`` with ``mode`` ('delta' or 'set') and an optional ``price``.
+    Variants are resolved with one SELECT, written with executemany UPDATEs
+    and product totals are recomputed with a single aggregate UPDATE.
+    Returns a per-row report list.
+    """
+    report = []
+    parsed = []
+
+    # Validate rows before touching the database
+    for index, change in enumerate(changes, start=1):
+        row = {'row': index, 'key': change.get('sku') or change.get('variant_id'), 'status': 'error'}
+        report.append(row)
+        try:
+            variant_id = change.get('variant_id')
+            sku = (change.get('sku') or '').strip() or None
+            if variant_id not in (None, ''):
+                variant_id = int(variant_id)
+            else:
+                variant_id = None
+            if variant_id is None and not sku:
+                row['message'] = 'SKU or variant ID is required'
+                continue
+
+            mode = change.get('mode', 'set')
+            if mode not in ('delta', 'set'):
+                row['message'] = f'Unknown stock mode "{mode}"'
+                continue
+
+            stock = change.get('stock')
+            if stock in (None, ''):
+                stock = None
+            elif isinstance(stock, float) and stock.is_integer():
+                stock = int(stock)
+            elif isinstance(stock, bool) or not re.fullmatch(r'[+-]?\d+', str(stock).strip()):
+                # int() would truncate 2.7 (or accept True) without a word
+                row['message'] = 'Stock must be a whole number'
+                continue
+            else:
+                stock = int(stock)
+            if stock is not None and mode == 'set' and stock < 0:
+                row['message'] = 'Stock cannot be negative'
+                continue
+
+            price = change.get('price')
+            price = float(price) if price not in (None, '') else None
+            if price is not None and not math.isfinite(price):
+                row['message'] = 'Price must be a number'
+                continue
+            if price is not None and price <= 0:
+                row['message'] = 'Price must be greater than 0'
+                continue
+
+            if stock is None and price is None:
+                row['message'] = 'Nothing to change'
+                continue
+        except (ValueError, TypeError):
+            row['message'] = 'Invalid stock or price value'
+            continue
+
+        parsed.append((row, variant_id, sku, mode, stock, price))
+
+    if not parsed:
+        return report
+
+    variant_table = ProductVariant.__table__
+    product_table = Product.__table__
+
+    # Resolve every SKU / ID in one query
+    ids = {p[1] for p in parsed if p[1] is not None}
+    skus = {p[2] for p in parsed if p[1] is None}
+    conditions = []
+    if ids:
+        conditions.append(variant_table.c.id.in_(ids))
+    if skus:
+        conditions.append(variant_table.c.sku.in_(skus))
+    rows = db.session.execute(
+        select(variant_table.c.id, variant_table.c.sku, variant_table.c.product_id,
+               variant_table.c.stock, variant_table.c.price)
+        .where(or_(*conditions))
+    ).all()
+    by_id = {r.id: r for r in rows}
+    by_sku = {r.sku: r for r in rows if r.sku}
+
+    # Merge changes per variant, in row order
+    merged = {}
+    for row, variant_id, sku, mode, stock, price in parsed:
+        found = by_id.get(variant_id) if variant_id is not None else by_sku.get(sku)
+        if not found:
+            row['message'] = 'Variant not found'
+            continue
+
+        entry = merged.setdefault(found.id, {'mode': None, 'stock': 0, 'price': None, 'rows': []})
+        # A delta after an absolute value is resolved here, not clamped in SQL
+        if stock is not None and mode == 'delta' and entry['mode'] == 'set' and entry['stock'] + stock < 0:
+            row['message'] = f"Stock cannot be negative (set to {entry['stock']} by an earlier row)"
+            continue
+
+        row.update(variant_id=found.id, sku=found.sku, product_id=found.product_id,
+                   old_stock=found.stock or 0, old_price=found.price)
+        if stock is not None:
+            if mode == 'set':
+                entry['mode'] = 'set'
+                entry['stock'] = stock
+            else:
+                entry['mode'] = entry['mode'] or 'delta'
+                entry['stock'] += stock
+        if price is not None:
+            entry['price'] = price
+        entry['rows'].append(row)
+
+    if not merged:
+        return report
+
+    try:
+        set_params = [{'b_id': vid, 'b_stock': e['stock']} for vid, e in merged.items() if e['mode'] == 'set']
+        delta_params = [{'b_id': vid, 'b_delta': e['stock']} for vid, e in merged.items() if e['mode'] == 'delta']
+        price_params = [{'b_id': vid, 'b_price': e['price']} for vid, e in merged.items() if e['price'] is not None]
+
+        if set_params:
+            db.session.execute(
+                update(variant_table)
+                .where(variant_table.c.id == bindparam('b_id'))
+                .values(stock=bindparam('b_stock')),
+                set_params
+            )
+        if delta_params:
+            # Clamp at zero in SQL so concurrent checkouts are not overwritten
+            new_stock = func.coalesce(variant_table.c.stock, 0) + bindparam('b_delta')
+            db.session.execute(
+                update(variant_table)
+                .where(variant_table.c.id == bindparam('b_id'))
+                .values(stock=case((new_stock < 0, 0), else_=new_stock)),
+                delta_params
+            )
+        if price_params:
+            db.session.execute(
+                update(variant_table)
+                .where(variant_table.c.id == bindparam('b_id'))
+                .values(price=bindparam('b_price')),
+                price_params
+            )
+
+        # Recompute affected product totals in one aggregate statement
+        product_ids = {r['product_id'] for e in merged.values() for r in e['rows']}
+        stock_sum = select(func.coalesce(func.sum(variant_table.c.stock), 0))\
+            .where(variant_table.c.product_id == product_table.c.id)\
+            .scalar_subquery()
+        db.session.execute(
+            update(product_table)
+            .where(product_table.c.id.in_(product_ids))
+            .values(total_quantity=stock_sum)
+        )
+
+        updated = db.session.execute(
+            select(variant_table.c.id, variant_table.c.stock, variant_table.c.price)
+            .where(variant_table.c.id.in_(merged.keys()))
+        ).all()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    for r in updated:
+        for row in merged[r.id]['rows']:
+            row.update(status='updated', new_stock=r.stock, new_price=r.price, message='Updated')
+
+    return report
+
+def next_sequence_value(sequence):
+    """Return the next value of a DB sequence (counter table on SQLite)"""
+    if db.engine.dialect.supports_sequences:
+        return db.session.execute(select(sequence.next_value())).scalar()
+
+    counter = SequenceCounter.__table__
+    # One upsert: creates the row on first use (a concurrent first use bumps
+    # it instead of failing on the primary key) and takes the write lock, so
+    # concurrent workers serialize here
+    insert = sqlite_insert(counter).values(name=sequence.name, value=1)
+    db.session.execute(insert.on_conflict_do_update(
+        index_elements=['name'],
+        set_={'value': counter.c.value + 1}
+    ))
+    return db.session.execute(
+        select(counter.c.value).where(counter.c.name == sequence.name)
+    ).scalar()
+
+def slugify(value):
+    """Lowercase, hyphenated slug for a name"""
+    slug = re.sub(r'[^\w\s-]', '', value.lower())
+    return re.sub(r'[-\s]+', '-', slug).strip('-')
+
+def is_digits(expr):
+    """SQL test that the string ``expr`` is a non-empty run of digits"""
+    if db.engine.dialect.name == 'postgresql':
+        return expr.op('~')('^[0-9]+$')
+    return and_(expr != '', expr.op('NOT GLOB')('*[^0-9]*'))
+
 def generate_unique_slug(base_name, model_class, current_id=None):
-    """Generate unique slug for product or category"""
-    base_slug = re.sub(r'[^\w\s-]', '', base_name.lower())
-    base_slug = re.sub(r'[-\s]+', '-', base_slug).strip('-')
-    
-    slug = base_slug
-    counter = 1
-    
-    while True:
-        query = model_class.query.filter(func.lower(model_class.slug) == slug.lower())
-        if current_id:
-            query = query.filter(model_class.id != current_id)
-        
-        if not query.first():
-            break
-        
-        slug = f"{base_slug}-{counter}"
-        counter += 1
-    
-    return slug
+    """Generate unique slug for product or category
+
+    Resolves conflicts with a single aggregate query over the exact slug and
+    its "slug-N" siblings (prefix LIKE on lower(slug)): whether the slug is
+    taken, and max(N), so the next free one is max(N) + 1.
+    """
+    base_slug = slugify(base_name)
+    escaped = base_slug.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    slug_lower = func.lower(model_class.slug)
+    suffix = func.substr(slug_lower, len(base_slug) + 2)
+    is_sibling = slug_lower.like(f'{escaped}-%', escape='\\')
+
+    query = db.session.query(
+        func.count(case((slug_lower == base_slug, 1))),
+        func.max(case((and_(is_sibling, is_digits(suffix)), cast(suffix, BigInteger))))
+    ).filter(or_(slug_lower == base_slug, is_sibling))
+    if current_id:
+        query = query.filter(model_class.id != current_id)
+    exact, max_suffix = query.one()
+
+    if not exact:
+        return base_slug
+    return f"{base_slug}-{(max_suffix or 0) + 1}"
 
 def generate_unique_sku(base_sku=None):
-    """Generate unique SKU"""
+    """Generate unique SKU from the SKU sequence"""
     if base_sku:
         if ProductVariant.query.filter_by(sku=base_sku).first() is None:
             return base_sku
-    
-    while True:
-        sku = f"HAIR-{random.randint(10000, 99999)}-{random.randint(100, 999)}"
-        if ProductVariant.query.filter_by(sku=sku).first() is None:
-            return sku
+
+    return f"HAIR-{next_sequence_value(SKU_SEQUENCE):06d}"
 
 def save_uploaded_file(file):
     """Save uploaded file to uploads folder"""
     if not file or file.filename == '':
-        print(f"⚠️ No file provided for upload", file=sys.stderr)
+        upload_logger.warning("No file provided for upload")
         return None
 
     if not allowed_file(file.filename):
-        print(f"⚠️ File type not allowed: {file.filename}", file=sys.stderr)
+        upload_logger.warning("File type not allowed: %s", file.filename)
         return None
 
     try:
@@ -601,14 +1727,357 @@ def save_uploaded_file(file):
         upload_path = os.path.join(upload_folder, unique_filename)
         file.save(upload_path)
 
-        print(f"✅ File saved: {unique_filename}", file=sys.stderr)
+        upload_logger.info("File saved: %s", unique_filename)
         return f"/static/uploads/{unique_filename}"
 
     except Exception as e:
-        print(f"❌ CRITICAL ERROR saving file: {str(e)}", file=sys.stderr)
-        traceback.print_exc(file=sys.stderr)
+        upload_logger.exception("Error saving file: %s", e)
+        return None
+
+def variant_to_dict(variant):
+    """JSON-ready variant for the product page script and the variants endpoint"""
+    return {
+        'id': variant.id,
+        'name': variant.name,
+        'length': variant.length,
+        'texture': variant.texture,
+        'color': variant.color,
+        'price': variant.price,
+        'stock': variant.stock,
+        'available': variant.stock > 0
+    }
+
+VARIANT_AXES = ('length', 'texture', 'color')
+
+def build_variant_matrix(variants):
+    """Length x texture x color grid over variant dicts, for constant-time lookups in the browser
+
+    ``cells`` is dense and row-major over VARIANT_AXES: the cell for axis
+    positions (l, t, c) is at (l * len(textures) + t) * len(colors) + c and
+    holds [variant id, price, stock], or None where no variant exists. A
+    missing attribute is the empty string on its axis.
+    """
+    def value(variant, axis):
+        return variant[axis] or ''
+
+    axes = {axis: sorted({value(variant, axis) for variant in variants}) for axis in VARIANT_AXES}
+    positions = {axis: {item: i for i, item in enumerate(values)} for axis, values in axes.items()}
+    textures, colors = len(axes['texture']), len(axes['color'])
+
+    cells = [None] * (len(axes['length']) * textures * colors)
+    for variant in variants:
+        l, t, c = (positions[axis][value(variant, axis)] for axis in VARIANT_AXES)
+        slot = (l * textures + t) * colors + c
+        current = cells[slot]
+        # Duplicate combinations: keep the one in stock, then the cheaper
+        if current is None or (variant['stock'] > 0, -variant['price']) > (current[2] > 0, -current[1]):
+            cells[slot] = [variant['id'], variant['price'], variant['stock']]
+    return {'axes': axes, 'cells': cells, 'count': len(variants)}
+
+REVIEWS_PER_PAGE = 10
+
+def load_rating_summaries(products):
+    """Fill ``product.rating_summary`` for a page of products with one IN query"""
+    product_ids = [product.id for product in products]
+    summaries = {}
+    if product_ids:
+        summaries = {summary.product_id: summary for summary in ProductRatingSummary.query
+                     .filter(ProductRatingSummary.product_id.in_(product_ids))}
+    for product in products:
+        set_committed_value(product, 'rating_summary', summaries.get(product.id))
+
+def refresh_rating_summaries(product_ids):
+    """Recount the rating summaries of ``product_ids`` from their approved reviews
+
+    Runs in the transaction that changed the reviews, so the summaries commit
+    or roll back with it; the caller commits. Existing summary rows are locked
+    first (PostgreSQL) so concurrent moderation of one product can't interleave.
+    """
+    product_ids = {product_id for product_id in product_ids if product_id}
+    if not product_ids:
+        return
+    db.session.flush()
+
+    summaries = {summary.product_id: summary for summary in ProductRatingSummary.query
+                 .filter(ProductRatingSummary.product_id.in_(product_ids))
+                 .with_for_update()}
+    counts = {product_id: [0] * 6 for product_id in product_ids}
+    rows = db.session.query(Review.product_id, Review.rating, func.count(Review.id))\
+        .filter(Review.product_id.in_(product_ids), Review.approved == True)\
+        .group_by(Review.product_id, Review.rating)
+    for product_id, rating, count in rows:
+        if 1 <= rating <= 5:
+            counts[product_id][rating] += count
+
+    for product_id, stars in counts.items():
+        summary = summaries.get(product_id)
+        if summary is None:
+            summary = ProductRatingSummary(product_id=product_id)
+            db.session.add(summary)
+        summary.review_count = sum(stars)
+        summary.rating_total = sum(rating * count for rating, count in enumerate(stars))
+        summary.average_rating = round(summary.rating_total / summary.review_count, 2) if summary.review_count else 0.0
+        for rating in range(1, 6):
+            setattr(summary, f'stars_{rating}', stars[rating])
+
+def encode_review_cursor(review):
+    return f"{review.created_at:%Y%m%d%H%M%S%f}-{review.id}"
+
+def decode_review_cursor(value):
+    """(created_at, id) from a review cursor, or None if it is missing or malformed"""
+    try:
+        stamp, review_id = (value or '').split('-')
+        return datetime.strptime(stamp, '%Y%m%d%H%M%S%f'), int(review_id)
+    except ValueError:
+        return None
+
+def approved_reviews_page(product_id, after=None, limit=REVIEWS_PER_PAGE):
+    """A page of a product's approved reviews, newest first, and the cursor of the next page"""
+    query = Review.query.filter(Review.product_id == product_id, Review.approved == True)
+    position = decode_review_cursor(after)
+    if position:
+        created_at, review_id = position
+        query = query.filter(or_(Review.created_at < created_at,
+                                 and_(Review.created_at == created_at, Review.id < review_id)))
+    reviews = query.order_by(Review.created_at.desc(), Review.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_review_cursor(reviews[limit - 1]) if len(reviews) > limit else None
+    return reviews[:limit], next_cursor
+
+# Neighbours kept per product, and how the signals are blended into one score
+RECOMMENDATIONS_PER_PRODUCT = 12
+RECOMMENDATION_WEIGHTS = {'bought_together': 2.0, 'attributes': 1.0, 'category': 0.25}
+
+def bought_together_scores(product_ids):
+    """{product: {other: cosine}} from how often two products share an order
+
+    Cosine over order sets (together / sqrt(orders_a * orders_b)) so best
+    sellers don't become everyone's neighbour. Cancelled orders are ignored.
+    """
+    placed = db.session.query(OrderItem.order_id, OrderItem.product_id)\
+        .join(Order, Order.id == OrderItem.order_id)\
+        .filter(Order.status != 'cancelled', OrderItem.product_id.in_(product_ids))\
+        .distinct()\
+        .subquery()
+    mine, theirs = aliased(placed), aliased(placed)
+
+    order_counts = dict(db.session.query(placed.c.product_id, func.count())
+                        .group_by(placed.c.product_id))
+    pairs = db.session.query(mine.c.product_id, theirs.c.product_id, func.count())\
+        .join(theirs, and_(mine.c.order_id == theirs.c.order_id, mine.c.product_id != theirs.c.product_id))\
+        .group_by(mine.c.product_id, theirs.c.product_id)
+
+    scores = {}
+    for product_id, other_id, together in pairs:
+        scores.setdefault(product_id, {})[other_id] = \
+            together / math.sqrt(order_counts[product_id] * order_counts[other_id])
+    return scores
+
+def attribute_scores(product_ids):
+    """{product: {other: jaccard}} over the textures and lengths of in-stock variants"""
+    attributes = {}
+    rows = db.session.query(ProductVariant.product_id, ProductVariant.texture, ProductVariant.length)\
+        .filter(ProductVariant.product_id.in_(product_ids), ProductVariant.stock > 0)\
+        .distinct()
+    for product_id, texture, length in rows:
+        values = attributes.setdefault(product_id, set())
+        if texture:
+            values.add(('texture', texture.strip().lower()))
+        if length:
+            values.add(('length', length.strip().lower()))
+
+    # Only products sharing at least one attribute are ever compared
+    holders = {}
+    for product_id, values in attributes.items():
+        for value in values:
+            holders.setdefault(value, []).append(product_id)
+
+    scores = {}
+    for product_id, values in attributes.items():
+        shared = {}
+        for value in values:
+            for other_id in holders[value]:
+                if other_id != product_id:
+                    shared[other_id] = shared.get(other_id, 0) + 1
+        scores[product_id] = {other_id: count / len(values | attributes[other_id])
+                              for other_id, count in shared.items()}
+    return scores
+
+def rebuild_recommendations(per_product=RECOMMENDATIONS_PER_PRODUCT):
+    """Recompute the recommendation table for all active products; returns build stats
+
+    Meant for a batch job (see build_recommendations.py). The table is
+    replaced in a single transaction, so pages keep reading the previous
+    build until the commit.
+    """
+    started = time.perf_counter()
+    categories = dict(db.session.query(Product.id, Product.category_id).filter(Product.active == True))
+    product_ids = list(categories)
+    weights = RECOMMENDATION_WEIGHTS
+
+    bought = bought_together_scores(product_ids) if product_ids else {}
+    similar = attribute_scores(product_ids) if product_ids else {}
+
+    built_at = datetime.utcnow()
+    rows = []
+    for product_id in product_ids:
+        together = bought.get(product_id, {})
+        alike = similar.get(product_id, {})
+        candidates = []
+        for other_id in together.keys() | alike.keys():
+            bought_part = weights['bought_together'] * together.get(other_id, 0)
+            similar_part = weights['attributes'] * alike.get(other_id, 0)
+            if categories[product_id] and categories[product_id] == categories[other_id]:
+                similar_part += weights['category']
+            reason = 'bought_together' if bought_part >= similar_part else 'similar'
+            candidates.append((bought_part + similar_part, other_id, reason))
+        candidates.sort(key=lambda candidate: (-candidate[0], candidate[1]))
+        rows.extend({
+            'product_id': product_id,
+            'rank': rank,
+            'related_product_id': other_id,
+            'score': round(score, 4),
+            'reason': reason,
+            'built_at': built_at,
+        } for rank, (score, other_id, reason) in enumerate(candidates[:per_product], start=1))
+
+    try:
+        ProductRecommendation.query.delete(synchronize_session=False)
+        for start in range(0, len(rows), 1000):
+            db.session.execute(ProductRecommendation.__table__.insert(), rows[start:start + 1000])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    stats = {
+        'products': len(product_ids),
+        'with_orders': len(bought),
+        'rows': len(rows),
+        'seconds': round(time.perf_counter() - started, 2),
+    }
+    catalog_logger.info("Recommendations rebuilt: %s", stats)
+    return stats
+
+def related_products_for(product, limit=4):
+    """Top ``limit`` active neighbours from the recommendation table, topped up from the category"""
+    card_options = (joinedload(Product.category), selectinload(Product.variants), selectinload(Product.images))
+    related = Product.query\
+        .join(ProductRecommendation, ProductRecommendation.related_product_id == Product.id)\
+        .filter(ProductRecommendation.product_id == product.id, Product.active == True)\
+        .options(*card_options)\
+        .order_by(ProductRecommendation.rank)\
+        .limit(limit)\
+        .all()
+
+    # Products added since the last build (or with no neighbours yet)
+    if len(related) < limit and product.category_id:
+        exclude = [product.id] + [item.id for item in related]
+        related += Product.query\
+            .filter(Product.category_id == product.category_id,
+                    Product.active == True,
+                    Product.id.notin_(exclude))\
+            .options(*card_options)\
+            .order_by(Product.featured.desc(), Product.created_at.desc(), Product.id.desc())\
+            .limit(limit - len(related))\
+            .all()
+    return related
+
+def build_product_detail(product_id):
+    """Everything the product page renders, as plain read-only objects; None if there's no such product
+
+    The product, category, rating summary and variants come back in one
+    statement and the images in a second; related products and the first
+    page of reviews follow. Derived values (stock, price range, lengths, the
+    variant matrix) are computed here once instead of per request.
+    """
+    product = Product.query\
+        .options(joinedload(Product.category),
+                 joinedload(Product.rating_summary),
+                 joinedload(Product.variants),
+                 selectinload(Product.images))\
+        .filter(Product.id == product_id)\
+        .first()
+    if product is None:
         return None
 
+    def image(item):
+        return types.SimpleNamespace(id=item.id, image_url=item.image_url, is_primary=item.is_primary)
+
+    def sorted_images(items):
+        return [image(item) for item in sorted(items, key=lambda item: (item.sort_order or 0, not item.is_primary, item.id))]
+
+    variants_data = [variant_to_dict(variant) for variant in
+                     sorted(product.variants, key=lambda variant: (variant.length or '', variant.texture or '', variant.id))]
+    variants_data_by_length = {}
+    for variant in variants_data:
+        variants_data_by_length.setdefault(variant['length'], []).append(variant)
+    variants = [types.SimpleNamespace(**variant) for variant in variants_data]
+    images = sorted_images(product.images)
+
+    category = product.category
+    summary = product.rating_summary
+    reviews, reviews_cursor = approved_reviews_page(product.id)
+
+    return types.SimpleNamespace(
+        product=types.SimpleNamespace(
+            id=product.id,
+            name=product.name,
+            slug=product.slug,
+            description=product.description,
+            base_price=product.base_price,
+            compare_price=product.compare_price,
+            category_id=product.category_id,
+            category=category and types.SimpleNamespace(id=category.id, name=category.name, slug=category.slug),
+            active=product.active,
+            stock=product.stock,
+            min_price=product.min_price,
+            max_price=product.max_price,
+            display_price=product.display_price,
+            available_lengths=product.available_lengths,
+            available_textures=product.available_textures,
+            variants=variants,
+            images=images,
+        ),
+        variants=variants,
+        variants_by_length={length: [types.SimpleNamespace(**variant) for variant in group]
+                            for length, group in variants_data_by_length.items()},
+        variant_matrix=build_variant_matrix(variants_data),
+        images=images,
+        rating_summary=summary and types.SimpleNamespace(
+            average_rating=summary.average_rating,
+            review_count=summary.review_count,
+            histogram=summary.histogram,
+        ),
+        related_products=[types.SimpleNamespace(
+            id=related.id,
+            name=related.name,
+            display_price=related.display_price,
+            images=sorted_images(related.images),
+        ) for related in related_products_for(product)],
+        reviews=[types.SimpleNamespace(
+            id=review.id,
+            customer_name=review.customer_name,
+            rating=review.rating,
+            comment=review.comment,
+            location=review.location,
+            verified_purchase=review.verified_purchase,
+            created_at=review.created_at,
+        ) for review in reviews],
+        reviews_cursor=reviews_cursor,
+    )
+
+def load_product_detail(product_id):
+    """build_product_detail, cached per product until the catalog version moves"""
+    version = catalog_version()
+    cached = PRODUCT_DETAIL_CACHE.get(product_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    detail = build_product_detail(product_id)
+    if detail is not None:
+        PRODUCT_DETAIL_CACHE.set(product_id, (version, detail))
+    return detail
+
 # ========== AUTHENTICATION DECORATORS ==========
 def admin_required(f):
     @wraps(f)
@@ -629,74 +2098,606 @@ def customer_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-# ========== CONTEXT PROCESSOR ==========
-@app.context_processor
-def inject_global_vars():
-    """Make variables available to all templates"""
-    categories = []
-    cart_count = 0
-    cart_total = 0
+# ========== RATE LIMITING ==========
+# Token buckets per route group, written as scope:requests/seconds. The ip
+# scope keys on the client address; session keys on the signed-in customer
+# or admin and falls back to the address. Override groups with
+#   RATE_LIMITS="login=ip:10/60,ip:50/3600;search=off"
+# ROUTE_CONCURRENCY caps how many requests of a group one worker runs at
+# once; the rest are shed with a 503 instead of queueing into the timeout.
+DEFAULT_RATE_LIMITS = {
+    'login': 'ip:10/60,ip:50/3600',
+    'register': 'ip:5/600',
+    'admin_login': 'ip:5/60,ip:30/3600',
+    'search': 'ip:30/60,session:30/60',
+    'delivery': 'ip:120/60,session:60/60',
+}
+DEFAULT_ROUTE_CONCURRENCY = {
+    'search': 2,
+}
 
+def parse_rate_rules(value):
+    """Parse "ip:10/60,session:5/1" into [(scope, requests, seconds)]"""
+    rules = []
+    for part in value.split(','):
+        if part.strip() in ('', 'off'):
+            continue
+        scope, limit = part.strip().split(':', 1)
+        requests_allowed, seconds = limit.split('/', 1)
+        if scope not in ('ip', 'session'):
+            raise ValueError(f"Unknown rate limit scope {scope!r}")
+        rules.append((scope, int(requests_allowed), float(seconds)))
+    return rules
+
+RATE_LIMITS = {group: parse_rate_rules(rules) for group, rules in DEFAULT_RATE_LIMITS.items()}
+for group_setting in os.environ.get('RATE_LIMITS', '').split(';'):
+    if '=' in group_setting:
+        group, rules = group_setting.split('=', 1)
+        RATE_LIMITS[group.strip()] = parse_rate_rules(rules)
+
+ROUTE_CONCURRENCY = dict(DEFAULT_ROUTE_CONCURRENCY)
+ROUTE_CONCURRENCY.update({group: int(limit) for group, limit in
+                          parse_log_settings(os.environ.get('ROUTE_CONCURRENCY')).items()})
+ROUTE_SLOTS = {group: threading.BoundedSemaphore(limit) for group, limit in ROUTE_CONCURRENCY.items() if limit > 0}
+
+class TokenBucketStore:
+    """Token buckets in a SQLite file shared by the workers on this host"""
+
+    PURGE_EVERY = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self.max_period = max([seconds for rules in RATE_LIMITS.values() for _, _, seconds in rules] or [0])
+        self._local = threading.local()
+        self._calls = 0
+
+    def _connection(self):
+        # One connection per thread, reopened in forked workers
+        if getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute('CREATE TABLE IF NOT EXISTS bucket '
+                         '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return self._local.conn
+
+    def take(self, buckets):
+        """Take a token from every (key, capacity, seconds) bucket, or from none.
+
+        Returns 0 when allowed, otherwise the seconds until all would allow.
+        """
+        now = time.time()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            placeholders = ','.join('?' * len(buckets))
+            stored = {key: (tokens, updated) for key, tokens, updated in conn.execute(
+                f'SELECT key, tokens, updated FROM bucket WHERE key IN ({placeholders})',
+                [key for key, _, _ in buckets])}
+            wait = 0
+            levels = []
+            for key, capacity, seconds in buckets:
+                rate = capacity / seconds
+                tokens, updated = stored.get(key, (capacity, now))
+                tokens = min(capacity, tokens + (now - updated) * rate)
+                if tokens < 1:
+                    wait = max(wait, (1 - tokens) / rate)
+                levels.append((key, tokens - 1, now))
+            if not wait:
+                conn.executemany('INSERT INTO bucket (key, tokens, updated) VALUES (?, ?, ?) '
+                                 'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated',
+                                 levels)
+            self._calls += 1
+            if self._calls % self.PURGE_EVERY == 0:
+                # An idle bucket is full again after its period; dropping it changes nothing
+                conn.execute('DELETE FROM bucket WHERE updated < ?', (now - self.max_period,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return wait
+
+RATE_LIMIT_STORE = TokenBucketStore(app.config['RATE_LIMIT_DB'])
+
+class RouteBusy(ServiceUnavailable):
+    """A ROUTE_CONCURRENCY cap is full (the 503 counterpart of a rate limit)"""
+    description = 'This page is busy right now. Please try again in a moment.'
+
+def rate_limit_identity(scope):
+    if scope == 'session':
+        if session.get('admin_id'):
+            return f"admin:{session['admin_id']}"
+        if session.get('customer_id'):
+            return f"customer:{session['customer_id']}"
+        # Anonymous visitors get a random id in their session, so each browser
+        # has its own bucket rather than sharing the IP's
+        return f"session:{session.setdefault('rate_limit_id', uuid.uuid4().hex)}"
+    return f"ip:{request.remote_addr}"
+
+def check_rate_limit(group):
+    """Seconds the client must wait before using ``group`` again (0 = go ahead)"""
+    rules = RATE_LIMITS.get(group)
+    if not rules or not app.config['RATE_LIMIT_ENABLED']:
+        return 0
+    buckets = [(f"{group}:{scope}:{requests_allowed}/{seconds:g}:{rate_limit_identity(scope)}", requests_allowed, seconds)
+               for scope, requests_allowed, seconds in rules]
     try:
-        categories = Category.query.all()
-    except Exception as e:
-        print(f"⚠️ Context processor error (categories): {str(e)}", file=sys.stderr)
-        categories = []
+        return RATE_LIMIT_STORE.take(buckets)
+    except sqlite3.Error as e:
+        # Fail open: a stuck limiter must not take the shop down with it
+        logger.warning("Rate limiter unavailable: %s", e)
+        return 0
 
-    if 'cart' in session:
-        cart_count = sum(item.get('quantity', 1) for item in session['cart'])
-        cart_total = calculate_cart_with_variants()
+def throttled(group, when=None):
+    """Apply the RATE_LIMITS and ROUTE_CONCURRENCY settings of ``group`` to a view
+
+    ``when`` narrows it to some requests, e.g. only POSTs or only searches.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if when is not None and not when():
+                return f(*args, **kwargs)
+
+            wait = check_rate_limit(group)
+            if wait:
+                record_throttled(group, 'rate')
+                raise TooManyRequests(retry_after=max(1, math.ceil(wait)))
+
+            slots = ROUTE_SLOTS.get(group)
+            if slots is None:
+                return f(*args, **kwargs)
+            if not slots.acquire(blocking=False):
+                record_throttled(group, 'concurrency')
+                raise RouteBusy(retry_after=1)
+            try:
+                return f(*args, **kwargs)
+            finally:
+                slots.release()
+        return decorated_function
+    return decorator
+
+def is_post():
+    return request.method == 'POST'
+
+# ========== REQUEST LOGGING ==========
+@app.before_request
+def assign_request_id():
+    """Tag the request with an ID (honouring an upstream X-Request-ID) for log correlation"""
+    g.request_id = request.headers.get('X-Request-ID', '')[:64] or uuid.uuid4().hex
+    g.request_started_at = time.perf_counter()
+
+@app.after_request
+def log_request(response):
+    """Emit one structured access log line per request"""
+    response.headers['X-Request-ID'] = g.get('request_id', '')
+    if 'request_started_at' in g:
+        latency_ms = round((time.perf_counter() - g.request_started_at) * 1000, 2)
+        http_logger.info('%s %s %s', request.method, request.path, response.status_code,
+                         extra={'status': response.status_code, 'latency_ms': latency_ms})
+    return response
+
+# ========== QUERY INSTRUMENTATION ==========
+# Per-endpoint aggregates for this worker, served by /admin/metrics/queries
+QUERY_STATS = {}
+QUERY_STATS_LOCK = threading.Lock()
+
+def query_shape(statement):
+    """Collapse whitespace so repeated statements compare equal"""
+    return ' '.join(statement.split())
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get('query_start_time')
+    if not start_times:
+        return
+    elapsed_ms = (time.perf_counter() - start_times.pop()) * 1000
+
+    if not has_request_context():
+        return
+
+    g.query_count = g.get('query_count', 0) + 1
+    g.query_time_ms = g.get('query_time_ms', 0.0) + elapsed_ms
+
+    shapes = g.setdefault('query_shapes', {})
+    shape = query_shape(statement)
+    shapes[shape] = shapes.get(shape, 0) + 1
+
+    if elapsed_ms >= app.config['SLOW_QUERY_MS']:
+        g.slow_query_count = g.get('slow_query_count', 0) + 1
+        query_logger.warning("Slow query (%.1fms) in %s: %s", elapsed_ms, request.endpoint, shape[:300])
+
+@app.after_request
+def add_query_stats_headers(response):
+    """Expose per-request query totals as headers in debug mode"""
+    if app.config['QUERY_STATS_HEADERS']:
+        response.headers['X-Query-Count'] = str(g.get('query_count', 0))
+        response.headers['X-Query-Time'] = f"{g.get('query_time_ms', 0.0):.2f}ms"
+    return response
+
+@app.teardown_request
+def record_query_stats(exc=None):
+    """Fold this request's query counts into the per-endpoint aggregates"""
+    endpoint = request.endpoint or 'unknown'
+    query_count = g.get('query_count', 0)
+    query_time_ms = g.get('query_time_ms', 0.0)
+
+    repeated = [
+        (shape, count) for shape, count in g.get('query_shapes', {}).items()
+        if count > app.config['N_PLUS_ONE_THRESHOLD']
+    ]
+    for shape, count in repeated:
+        query_logger.warning("Possible N+1 in %s: %dx %s", endpoint, count, shape[:300])
+
+    with QUERY_STATS_LOCK:
+        stats = QUERY_STATS.setdefault(endpoint, {
+            'requests': 0,
+            'queries': 0,
+            'query_time_ms': 0.0,
+            'max_queries': 0,
+            'slow_queries': 0,
+            'n_plus_one_requests': 0,
+            'n_plus_one_samples': [],
+        })
+        stats['requests'] += 1
+        stats['queries'] += query_count
+        stats['query_time_ms'] += query_time_ms
+        stats['max_queries'] = max(stats['max_queries'], query_count)
+        stats['slow_queries'] += g.get('slow_query_count', 0)
+        if repeated:
+            stats['n_plus_one_requests'] += 1
+            samples = stats['n_plus_one_samples']
+            for shape, count in repeated:
+                if len(samples) < 5 and shape[:300] not in samples:
+                    samples.append(shape[:300])
+
+# ========== METRICS ==========
+# With PROMETHEUS_MULTIPROC_DIR set (see gunicorn.conf.py) every worker writes
+# its samples to the shared directory and /metrics aggregates all of them.
+# The directory must exist before the metrics below are created, including for
+# scripts and `flask shell` run with the variable set outside gunicorn.
+if PROMETHEUS_AVAILABLE and os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+if PROMETHEUS_AVAILABLE:
+    REQUEST_LATENCY = Histogram(
+        'http_request_duration_seconds', 'Request latency by endpoint',
+        ['endpoint', 'method'],
+        buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+    )
+    REQUEST_COUNT = Counter(
+        'http_requests_total', 'Requests by endpoint and status',
+        ['endpoint', 'method', 'status']
+    )
+    REQUESTS_IN_PROGRESS = Gauge(
+        'http_requests_in_progress', 'Requests currently being handled',
+        ['endpoint'], multiprocess_mode='livesum'
+    )
+    REQUEST_QUERIES = Histogram(
+        'http_request_db_queries', 'SQL queries issued per request',
+        ['endpoint'], buckets=(1, 2, 5, 10, 20, 50, 100, 250)
+    )
+    DB_POOL_CHECKED_OUT = Gauge(
+        'db_pool_checked_out', 'Connections checked out of the pool',
+        multiprocess_mode='livesum'
+    )
+    DB_POOL_OVERFLOW = Gauge(
+        'db_pool_overflow', 'Connections open beyond pool_size',
+        multiprocess_mode='livesum'
+    )
+    DB_POOL_SIZE = Gauge(
+        'db_pool_size', 'Configured pool size per worker',
+        multiprocess_mode='liveall'
+    )
+    CACHE_LOOKUPS = Counter(
+        'cache_lookups_total', 'In-process cache lookups',
+        ['cache', 'result']
+    )
+    CHECKOUT_COUNT = Counter(
+        'checkout_total', 'Checkout attempts by result',
+        ['result']
+    )
+    RESPONSE_COMPRESSION_RATIO = Histogram(
+        'http_response_compression_ratio', 'Compressed size / original size of dynamic responses',
+        ['encoding'], buckets=(0.05, 0.1, 0.15, 0.2, 0.25, 0.3, 0.4, 0.5, 0.75, 1.0)
+    )
+    RESPONSE_BYTES = Counter(
+        'http_response_bytes_total', 'Dynamic response body bytes before and after compression',
+        ['encoding', 'stage']
+    )
+    PASSWORD_HASH_SECONDS = Histogram(
+        'password_hash_duration_seconds', 'Time spent hashing or verifying passwords',
+        ['operation'], buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+    )
+    PASSWORD_HASH_BUSY = Counter(
+        'password_hash_busy_total', 'Password operations refused because every hashing slot was busy',
+        ['operation']
+    )
+    THROTTLED_REQUESTS = Counter(
+        'http_requests_throttled_total', 'Requests refused by rate limits (429) or concurrency caps (503)',
+        ['group', 'reason']
+    )
+
+def record_cache_lookup(cache_name, hit):
+    if PROMETHEUS_AVAILABLE:
+        CACHE_LOOKUPS.labels(cache_name, 'hit' if hit else 'miss').inc()
 
-    csrf_token_value = ""
+def record_checkout(result):
+    if PROMETHEUS_AVAILABLE:
+        CHECKOUT_COUNT.labels(result).inc()
+
+def record_compression(encoding, original_size, compressed_size):
+    if PROMETHEUS_AVAILABLE:
+        RESPONSE_COMPRESSION_RATIO.labels(encoding).observe(compressed_size / original_size)
+        RESPONSE_BYTES.labels(encoding, 'original').inc(original_size)
+        RESPONSE_BYTES.labels(encoding, 'compressed').inc(compressed_size)
+
+def record_password_hash(operation, seconds):
+    if PROMETHEUS_AVAILABLE:
+        if seconds is None:
+            PASSWORD_HASH_BUSY.labels(operation).inc()
+        else:
+            PASSWORD_HASH_SECONDS.labels(operation).observe(seconds)
+
+def record_throttled(group, reason):
+    if PROMETHEUS_AVAILABLE:
+        THROTTLED_REQUESTS.labels(group, reason).inc()
+
+def record_pool_stats():
+    """Sample the engine pool (QueuePool only; SQLite files use NullPool)"""
+    pool = db.engine.pool
+    if hasattr(pool, 'checkedout'):
+        DB_POOL_CHECKED_OUT.set(pool.checkedout())
+        DB_POOL_OVERFLOW.set(max(pool.overflow(), 0))
+        DB_POOL_SIZE.set(pool.size())
+
+@app.before_request
+def start_request_metrics():
+    if PROMETHEUS_AVAILABLE:
+        g.request_start = time.perf_counter()
+        g.metrics_endpoint = request.endpoint or 'unknown'
+        REQUESTS_IN_PROGRESS.labels(g.metrics_endpoint).inc()
+
+@app.after_request
+def record_request_metrics(response):
+    if PROMETHEUS_AVAILABLE and 'request_start' in g:
+        endpoint = g.metrics_endpoint
+        REQUEST_LATENCY.labels(endpoint, request.method).observe(time.perf_counter() - g.request_start)
+        REQUEST_COUNT.labels(endpoint, request.method, str(response.status_code)).inc()
+        REQUEST_QUERIES.labels(endpoint).observe(g.get('query_count', 0))
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc=None):
+    if PROMETHEUS_AVAILABLE and 'request_start' in g:
+        REQUESTS_IN_PROGRESS.labels(g.metrics_endpoint).dec()
+        try:
+            record_pool_stats()
+        except Exception:
+            pass
+
+# ========== COMPRESSION ==========
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/xml', 'text/javascript',
+    'application/json', 'application/javascript', 'application/xml', 'image/svg+xml',
+}
+
+def negotiate_encoding():
+    """Preferred Content-Encoding the client accepts: br, then gzip, else None"""
+    accepted = request.accept_encodings
+    if BROTLI_AVAILABLE and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+def weaken_etag(response):
+    """Same entity, different bytes: a strong ETag would be wrong, a weak one still matches If-None-Match"""
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+def compress_response(response):
+    """Compress dynamic text responses above COMPRESS_MIN_SIZE"""
+    if response.direct_passthrough or response.is_streamed \
+            or response.status_code < 200 or response.status_code in (204, 206) \
+            or 'Content-Encoding' in response.headers \
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+    if response.status_code == 304:
+        # Keep the validator identical to the compressed 200 it stands in for
+        weaken_etag(response)
+        return response
+
+    data = response.get_data()
+    if len(data) < app.config['COMPRESS_MIN_SIZE']:
+        return response
+
+    if encoding == 'br':
+        compressed = brotli.compress(data, quality=app.config['COMPRESS_BR_QUALITY'])
+    else:
+        compressed = gzip.compress(data, compresslevel=app.config['COMPRESS_GZIP_LEVEL'], mtime=0)
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    weaken_etag(response)
+    record_compression(encoding, len(data), len(compressed))
+    return response
+
+# Registered first so it runs after every other after_request hook (they run in reverse)
+app.after_request_funcs.setdefault(None, []).insert(0, compress_response)
+
+def send_static_precompressed(filename):
+    """Static files, preferring the .br/.gz sibling written by precompress_static.py"""
+    encoding = negotiate_encoding()
+    if encoding:
+        compressed_name = filename + ('.br' if encoding == 'br' else '.gz')
+        if os.path.isfile(os.path.join(app.static_folder, compressed_name)):
+            response = send_from_directory(app.static_folder, compressed_name,
+                                           mimetype=mimetypes.guess_type(filename)[0])
+            response.headers['Content-Encoding'] = encoding
+            response.vary.add('Accept-Encoding')
+            return response
+    response = app.send_static_file(filename)
+    response.vary.add('Accept-Encoding')
+    return response
+
+app.view_functions['static'] = send_static_precompressed
+
+# ========== CONTEXT PROCESSOR ==========
+class LazyCsrfToken:
+    """Template handle that mints a CSRF token only when it is rendered.
+
+    Works both as ``{{ csrf_token }}`` and ``{{ csrf_token() }}``; POST forms
+    use those, so a form rendered for a first-time visitor still carries a
+    real token. Pages without a form never touch the session, so anonymous
+    catalog responses go out without a Set-Cookie. ``csrf_token.issued``
+    renders the token only if this session already has one (used for the
+    <meta> tag; ensureCSRFToken in csrf_script.html fetches /csrf-token on
+    demand otherwise).
+    """
+
+    def __call__(self):
+        try:
+            return generate_csrf()
+        except Exception as e:
+            logger.warning("CSRF token generation error: %s", e)
+            return ""
+
+    def __str__(self):
+        return self()
+
+    __html__ = __str__
+
+    @property
+    def issued(self):
+        if app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token') in session:
+            return self()
+        return ""
+
+lazy_csrf_token = LazyCsrfToken()
+
+def template_global(func):
+    """Expose ``func`` to templates as a lazy proxy, computed at most once per request"""
+    name = func.__name__
+
+    def load():
+        values = g.setdefault('template_globals', {})
+        if name not in values:
+            values[name] = func()
+        return values[name]
+
+    return LocalProxy(load)
+
+@template_global
+def lazy_categories():
     try:
-        csrf_token_value = generate_csrf()
+        return Category.query.all()
     except Exception as e:
-        print(f"⚠️ CSRF token generation error: {str(e)}", file=sys.stderr)
-
-    return dict(
-        now=datetime.now(),
-        categories=categories,
-        cart_count=cart_count,
-        cart_total=cart_total,
-        current_year=datetime.now().year,
-        config=BUSINESS_CONFIG,
-        format_price=format_price,
-        csrf_token=csrf_token_value,
-        min=min,
-        max=max,
-        random=random,
-        check_stock=check_stock_availability
-    )
+        logger.warning("Context processor error (categories): %s", e)
+        return []
+
+@template_global
+def lazy_cart_count():
+    return sum(item.get('quantity', 1) for item in session.get('cart', []))
+
+@template_global
+def lazy_cart_total():
+    return calculate_cart_with_variants()
+
+@template_global
+def lazy_now():
+    return datetime.now()
+
+@template_global
+def lazy_current_year():
+    return lazy_now.year
+
+TEMPLATE_GLOBALS = dict(
+    now=lazy_now,
+    categories=lazy_categories,
+    cart_count=lazy_cart_count,
+    cart_total=lazy_cart_total,
+    current_year=lazy_current_year,
+    config=BUSINESS_CONFIG,
+    format_price=format_price,
+    csrf_token=lazy_csrf_token,
+    min=min,
+    max=max,
+    random=random,
+    check_stock=check_stock_availability
+)
+
+# Backslash-escapes for strings spliced into JS literals, safe inside <script> and on* attributes
+JS_ESCAPES = {ord(char): f'\\u{ord(char):04X}' for char in '\\\'"<>&=-;`'}
+JS_ESCAPES.update({code: f'\\u{code:04X}' for code in (*range(32), 0x2028, 0x2029)})
+
+@app.template_filter('escapejs')
+def escapejs_filter(value):
+    return Markup(str(value if value is not None else '').translate(JS_ESCAPES))
+
+@app.context_processor
+def inject_global_vars():
+    """Make variables available to all templates (lazy; see template_global)"""
+    return TEMPLATE_GLOBALS
 
 # ========== ERROR HANDLERS ==========
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('404.html', config=BUSINESS_CONFIG), 404
 
+@app.errorhandler(429)
+@app.errorhandler(RouteBusy)
+def throttled_error(error):
+    retry_after = int(dict(error.get_headers()).get('Retry-After', 1))
+    if request.is_json or request.path.startswith('/api/'):
+        response = jsonify({'success': False, 'error': error.description, 'retry_after': retry_after})
+    else:
+        response = app.make_response(render_template('429.html', code=error.code, retry_after=retry_after))
+    response.status_code = error.code
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
 @app.errorhandler(500)
 def internal_error(error):
-    print(f"❌ 500 Error: {str(error)}", file=sys.stderr)
-    traceback.print_exc(file=sys.stderr)
+    http_logger.exception("500 Error: %s", error)
     return render_template('500.html', config=BUSINESS_CONFIG), 500
 
 # ========== DATABASE INITIALIZATION ==========
 def init_db():
     """Initialize database with tables and sample data"""
-    print("🔄 Initializing database...", file=sys.stderr)
+    db_logger.info("Initializing database...")
 
     try:
         # Test database connection
         db.session.execute(text('SELECT 1'))
-        print("✅ Database connection successful", file=sys.stderr)
+        db_logger.info("Database connection successful")
     except Exception as e:
-        print(f"❌ Database connection failed: {str(e)}", file=sys.stderr)
+        db_logger.error("Database connection failed: %s", e)
         return False
 
     try:
         with app.app_context():
             # Create all tables
             db.create_all()
-            print("✅ Database tables created", file=sys.stderr)
+            db_logger.info("Database tables created")
+
+            # create_all() skips indexes on tables that already exist
+            for index in LOOKUP_INDEXES:
+                try:
+                    index.create(bind=db.engine)
+                except (OperationalError, ProgrammingError):
+                    pass
 
             # Create admin user if none exists
             if User.query.count() == 0:
@@ -707,7 +2708,7 @@ def init_db():
                 )
                 admin.set_password('admin123')
                 db.session.add(admin)
-                print("✅ Admin user created: admin/admin123", file=sys.stderr)
+                db_logger.info("Admin user created: admin")
 
             # Create sample categories if none exist
             if Category.query.count() == 0:
@@ -724,62 +2725,92 @@ def init_db():
                     category = Category(name=name, slug=slug, description=desc)
                     db.session.add(category)
 
-                print("✅ Sample categories added", file=sys.stderr)
+                db_logger.info("Sample categories added")
+
+            if SequenceCounter.query.get(CATALOG_VERSION_KEY) is None:
+                db.session.add(SequenceCounter(name=CATALOG_VERSION_KEY, value=1))
+
+            if DeliveryRates.query.count() == 0:
+                db.session.add(DeliveryRates(version=1, rules=json.dumps(DEFAULT_DELIVERY_RATES)))
+                db_logger.info("Default delivery rates added")
+
+            # Reviews approved before the summary table existed
+            if ProductRatingSummary.query.first() is None:
+                reviewed = db.session.query(Review.product_id).filter(Review.approved == True).distinct()
+                refresh_rating_summaries([row[0] for row in reviewed])
 
             db.session.commit()
-            print("✅ Database initialization complete", file=sys.stderr)
+
+            # Recommendations are built by build_recommendations.py (deploy step
+            # and schedule), never here: the build is too heavy for a request
+            if ProductRecommendation.query.first() is None:
+                db_logger.info("No product recommendations yet; run build_recommendations.py")
+
+            db_logger.info("Database initialization complete")
             return True
     except Exception as e:
         db.session.rollback()
-        print(f"❌ Database initialization error: {str(e)}", file=sys.stderr)
-        traceback.print_exc(file=sys.stderr)
+        db_logger.exception("Database initialization error: %s", e)
         return False
 
 # ========== APPLICATION STARTUP HOOK ==========
+# Threaded/gevent workers can see several first requests at once
+INIT_LOCK = threading.Lock()
+
 @app.before_request
 def initialize_on_first_request():
     """Initialize database on first request"""
-    if not hasattr(app, 'has_initialized'):
-        print("🚀 Initializing database on first request...", file=sys.stderr)
+    if hasattr(app, 'has_initialized'):
+        return
+
+    with INIT_LOCK:
+        if hasattr(app, 'has_initialized'):
+            return
+
+        db_logger.info("Initializing database on first request...")
         try:
             init_db_success = init_db()
             if init_db_success:
-                print("✅ Database initialized successfully!", file=sys.stderr)
+                db_logger.info("Database initialized successfully")
             else:
-                print("⚠️ Database initialization had issues, but application will continue", file=sys.stderr)
+                db_logger.warning("Database initialization had issues, but application will continue")
         except Exception as e:
-            print(f"❌ Critical error during database initialization: {str(e)}", file=sys.stderr)
-            traceback.print_exc(file=sys.stderr)
-            print("⚠️ Application will continue, but some features may not work", file=sys.stderr)
+            db_logger.exception("Critical error during database initialization, some features may not work: %s", e)
 
         app.has_initialized = True
 
 # ========== PUBLIC ROUTES ==========
 
 @app.route('/')
+@read_replica
 def index():
     """Homepage"""
     try:
         featured_products = Product.query.filter_by(featured=True, active=True)\
-            .options(joinedload(Product.category))\
+            .options(joinedload(Product.category), joinedload(Product.rating_summary))\
             .limit(8)\
             .all()
 
         categories = Category.query.limit(6).all()
-        reviews = Review.query.filter_by(approved=True).limit(5).all()
+        reviews = Review.query.filter_by(approved=True)\
+            .order_by(Review.created_at.desc(), Review.id.desc())\
+            .limit(5)\
+            .all()
 
         return render_template('index.html',
                                featured_products=featured_products,
                                categories=categories,
                                reviews=reviews)
     except Exception as e:
-        print(f"❌ Homepage error: {str(e)}", file=sys.stderr)
+        logger.exception("Homepage error: %s", e)
         return render_template('index.html',
                                featured_products=[],
                                categories=[],
                                reviews=[])
 
 @app.route('/shop')
+@throttled('search', when=lambda: bool(request.args.get('search')))
+@read_replica
 def shop():
     """Shop page with filtering"""
     try:
@@ -849,12 +2880,11 @@ def shop():
         start_idx = (page - 1) * per_page
         end_idx = start_idx + per_page
         paginated_products = products[start_idx:end_idx]
-
-        categories = Category.query.all()
+        load_rating_summaries(paginated_products)
 
         return render_template('shop.html',
                                products=paginated_products,
-                               categories=categories,
+                               categories=lazy_categories,
                                category_id=category_id,
                                search_query=search,
                                lengths=lengths,
@@ -867,7 +2897,7 @@ def shop():
                                total_pages=total_pages,
                                total_products=total_products)
     except Exception as e:
-        print(f"❌ Shop error: {str(e)}", file=sys.stderr)
+        logger.exception("Shop error: %s", e)
         flash('Error loading products.', 'danger')
         return render_template('shop.html',
                                products=[],
@@ -881,80 +2911,116 @@ def shop():
                                total_products=0)
 
 @app.route('/product/<int:id>')
+@read_replica
 def product_detail(id):
-    """Product detail page"""
+    """Product detail page (cached snapshot, see load_product_detail)"""
     try:
-        product = Product.query\
-            .options(joinedload(Product.category))\
-            .get_or_404(id)
+        detail = load_product_detail(id)
+        if detail is None:
+            flash('Product not found.', 'danger')
+            return redirect(url_for('shop'))
 
-        if not product.active:
+        if not detail.product.active:
             flash('This product is currently unavailable.', 'warning')
             return redirect(url_for('shop'))
 
-        variants = ProductVariant.query\
-            .filter_by(product_id=id)\
-            .order_by(ProductVariant.length, ProductVariant.texture)\
-            .all()
-
-        images = ProductImage.query\
-            .filter_by(product_id=id)\
-            .order_by(ProductImage.sort_order, ProductImage.is_primary.desc())\
-            .all()
-
-        variants_by_length = {}
-        for variant in variants:
-            if variant.length not in variants_by_length:
-                variants_by_length[variant.length] = []
-            variants_by_length[variant.length].append(variant)
-
-        related_products = Product.query\
-            .options(joinedload(Product.category))\
-            .filter(
-                Product.category_id == product.category_id,
-                Product.id != product.id,
-                Product.active == True
-            ).limit(4).all()
-
-        reviews = Review.query.filter_by(product_id=id, approved=True).order_by(Review.created_at.desc()).all()
-
-        return render_template('product_detail.html',
-                               product=product,
-                               variants=variants,
-                               variants_by_length=variants_by_length,
-                               images=images,
-                               related_products=related_products,
-                               reviews=reviews)
+        return render_template('product_detail.html', **vars(detail))
     except Exception as e:
-        print(f"❌ Product detail error: {str(e)}", file=sys.stderr)
+        logger.exception("Product detail error: %s", e)
         flash('Product not found.', 'danger')
         return redirect(url_for('shop'))
 
+@app.route('/product/<int:id>/variants/matrix')
+@read_replica
+def product_variant_matrix(id):
+    """Variant matrix (see build_variant_matrix) from the cached product snapshot, with an ETag"""
+    try:
+        detail = load_product_detail(id)
+        if detail is None or not detail.product.active:
+            return jsonify({'success': False, 'error': 'Product not found'}), 404
+        return api_response({'success': True, 'product_id': id, **detail.variant_matrix})
+    except Exception as e:
+        logger.exception("Variant matrix error: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/product/<int:id>/reviews')
+@read_replica
+def product_reviews(id):
+    """Next page of a product's approved reviews, from the cursor the page was given"""
+    try:
+        reviews, next_cursor = approved_reviews_page(id, after=request.args.get('after'))
+        return jsonify({
+            'success': True,
+            'reviews': [{
+                'id': review.id,
+                'customer_name': review.customer_name,
+                'rating': review.rating,
+                'comment': review.comment or '',
+                'location': review.location,
+                'verified_purchase': bool(review.verified_purchase),
+                'date': review.created_at.strftime('%B %d, %Y') if review.created_at else '',
+            } for review in reviews],
+            'next_cursor': next_cursor,
+        })
+    except Exception as e:
+        logger.exception("Product reviews error: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/product/<int:product_id>/review', methods=['POST'])
+def add_review(product_id):
+    """Submit a review; it is published once an admin approves it"""
+    if 'customer_id' not in session:
+        flash('Please login to submit a review.', 'warning')
+        return redirect(url_for('customer_login'))
+
+    try:
+        product = Product.query.get_or_404(product_id)
+        rating = request.form.get('rating', type=int)
+        comment = request.form.get('comment', '').strip()
+
+        if rating not in range(1, 6) or not comment:
+            flash('Please choose a rating and write a few words about the product.', 'danger')
+            return redirect(url_for('product_detail', id=product.id))
+
+        customer = Customer.query.get(session['customer_id'])
+        purchased = db.session.query(OrderItem.id)\
+            .join(Order, Order.id == OrderItem.order_id)\
+            .filter(Order.customer_id == customer.id, OrderItem.product_id == product.id)\
+            .first() is not None
+
+        db.session.add(Review(
+            product_id=product.id,
+            customer_name=f"{customer.first_name or ''} {customer.last_name or ''}".strip() or 'Customer',
+            email=customer.email,
+            rating=rating,
+            comment=comment[:2000],
+            location=customer.city,
+            verified_purchase=purchased,
+            approved=False
+        ))
+        db.session.commit()
+
+        flash('Thank you! Your review will appear once it has been approved.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Add review error: %s", e)
+        flash('Error submitting review. Please try again.', 'danger')
+
+    return redirect(url_for('product_detail', id=product_id))
+
 @app.route('/product/<int:id>/variants')
+@read_replica
 def get_product_variants(id):
     """Get product variants for AJAX"""
     try:
         product = Product.query.get_or_404(id)
         variants = ProductVariant.query.filter_by(product_id=id).all()
 
-        variants_data = []
-        for variant in variants:
-            variants_data.append({
-                'id': variant.id,
-                'name': variant.name,
-                'length': variant.length,
-                'texture': variant.texture,
-                'color': variant.color,
-                'price': variant.price,
-                'stock': variant.stock,
-                'available': variant.stock > 0
-            })
-
         return jsonify({
             'success': True,
             'product_id': product.id,
             'product_name': product.name,
-            'variants': variants_data
+            'variants': [variant_to_dict(variant) for variant in variants]
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -1070,7 +3136,7 @@ def add_to_cart(product_id):
         return redirect(request.referrer or url_for('cart'))
 
     except Exception as e:
-        print(f"❌ Add to cart error: {str(e)}", file=sys.stderr)
+        checkout_logger.exception("Add to cart error: %s", e)
         flash('Error adding to cart. Please try again.', 'danger')
         return redirect(request.referrer or url_for('shop'))
 
@@ -1135,8 +3201,10 @@ def clear_cart():
     return redirect(url_for('cart'))
 
 # ========== CUSTOMER AUTHENTICATION ==========
+PASSWORD_BUSY_MESSAGE = 'We are handling a lot of sign-ins right now. Please try again in a moment.'
 
 @app.route('/register', methods=['GET', 'POST'])
+@throttled('register', when=is_post)
 def customer_register():
     """Customer registration"""
     if request.method == 'POST':
@@ -1190,14 +3258,19 @@ def customer_register():
             flash('Registration successful! Welcome!', 'success')
             return redirect(url_for('account'))
 
+        except PasswordHashBusy:
+            db.session.rollback()
+            flash(PASSWORD_BUSY_MESSAGE, 'warning')
+            return render_template('register.html'), 503
         except Exception as e:
             db.session.rollback()
-            print(f"❌ Registration error: {str(e)}", file=sys.stderr)
+            auth_logger.exception("Registration error: %s", e)
             flash('Error during registration. Please try again.', 'danger')
 
     return render_template('register.html')
 
 @app.route('/login', methods=['GET', 'POST'])
+@throttled('login', when=is_post)
 def customer_login():
     """Customer login"""
     if request.method == 'POST':
@@ -1212,6 +3285,7 @@ def customer_login():
             customer = Customer.query.filter_by(email=email).first()
 
             if customer and customer.check_password(password):
+                commit_password_rehash(customer)
                 session['customer_id'] = customer.id
                 session['customer_name'] = f"{customer.first_name} {customer.last_name}"
                 session.pop('pending_checkout', None)
@@ -1224,8 +3298,11 @@ def customer_login():
             else:
                 flash('Invalid email or password', 'danger')
 
+        except PasswordHashBusy:
+            flash(PASSWORD_BUSY_MESSAGE, 'warning')
+            return render_template('login.html'), 503
         except Exception as e:
-            print(f"❌ Login error: {str(e)}", file=sys.stderr)
+            auth_logger.exception("Login error: %s", e)
             flash('Login error. Please try again.', 'danger')
 
     return render_template('login.html')
@@ -1245,14 +3322,128 @@ def account():
     """Customer account page"""
     try:
         customer = Customer.query.get(session['customer_id'])
-        orders = Order.query.filter_by(customer_id=customer.id).order_by(Order.created_at.desc()).all()
+        page = request.args.get('page', 1, type=int)
+        per_page = 10
+
+        order_count, last_update = account_order_stamp(customer.id)
+        summary = get_account_summary(customer.id, (order_count, last_update))
+        total_pages = max(1, (order_count + per_page - 1) // per_page)
+        page = min(max(page, 1), total_pages)
 
-        return render_template('account.html', customer=customer, orders=orders)
+        orders = account_orders_query(customer.id)\
+            .offset((page - 1) * per_page)\
+            .limit(per_page)\
+            .all()
+
+        return render_template('account.html',
+                               customer=customer,
+                               orders=orders,
+                               summary=summary,
+                               current_page=page,
+                               total_pages=total_pages)
     except Exception as e:
-        print(f"❌ Account error: {str(e)}", file=sys.stderr)
+        logger.exception("Account error: %s", e)
         flash('Error loading account information.', 'danger')
         return redirect(url_for('index'))
 
+@app.route('/account/address', methods=['POST'])
+@customer_required
+def update_address():
+    """Update customer shipping address"""
+    try:
+        customer = Customer.query.get(session['customer_id'])
+        address = request.form.get('address', '').strip()
+        city = request.form.get('city', '').strip()
+        state = request.form.get('state', '').strip()
+
+        if not all([address, city, state]):
+            flash('Please fill in address, city and state.', 'danger')
+            return redirect(url_for('account'))
+
+        customer.address = address
+        customer.city = city
+        customer.state = state
+        phone = request.form.get('phone', '').strip()
+        if phone:
+            customer.phone = phone
+
+        db.session.commit()
+        flash('Shipping address updated.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Update address error: %s", e)
+        flash('Error updating address. Please try again.', 'danger')
+    return redirect(url_for('account'))
+
+@app.route('/account/profile', methods=['POST'])
+@customer_required
+def update_profile():
+    """Update customer profile"""
+    try:
+        customer = Customer.query.get(session['customer_id'])
+        first_name = request.form.get('first_name', '').strip()
+        last_name = request.form.get('last_name', '').strip()
+        email = request.form.get('email', '').strip().lower()
+        phone = request.form.get('phone', '').strip()
+
+        if not all([first_name, last_name, email, phone]) or '@' not in email:
+            flash('Please fill in all required fields with valid values.', 'danger')
+            return redirect(url_for('account'))
+
+        if email != customer.email and Customer.query.filter_by(email=email).first():
+            flash('That email is already registered to another account.', 'danger')
+            return redirect(url_for('account'))
+
+        customer.first_name = first_name
+        customer.last_name = last_name
+        customer.email = email
+        customer.phone = phone
+        db.session.commit()
+
+        session['customer_name'] = f"{customer.first_name} {customer.last_name}"
+        flash('Profile updated.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Update profile error: %s", e)
+        flash('Error updating profile. Please try again.', 'danger')
+    return redirect(url_for('account'))
+
+@app.route('/account/password', methods=['POST'])
+@customer_required
+def change_password():
+    """Change customer password"""
+    try:
+        customer = Customer.query.get(session['customer_id'])
+        current_password = request.form.get('current_password', '')
+        new_password = request.form.get('new_password', '')
+        confirm_password = request.form.get('confirm_password', '')
+
+        if not customer.check_password(current_password):
+            flash('Current password is incorrect.', 'danger')
+        elif len(new_password) < 6:
+            flash('Password must be at least 6 characters.', 'danger')
+        elif new_password != confirm_password:
+            flash('New passwords do not match.', 'danger')
+        else:
+            customer.set_password(new_password)
+            db.session.commit()
+            flash('Password changed successfully.', 'success')
+    except PasswordHashBusy:
+        db.session.rollback()
+        flash(PASSWORD_BUSY_MESSAGE, 'warning')
+    except Exception as e:
+        db.session.rollback()
+        auth_logger.exception("Change password error: %s", e)
+        flash('Error changing password. Please try again.', 'danger')
+    return redirect(url_for('account'))
+
+@app.route('/csrf-token')
+def csrf_token_endpoint():
+    """Issue a CSRF token for pages that were served without one"""
+    response = jsonify({'csrf_token': generate_csrf()})
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
 # ========== ABOUT AND CONTACT ROUTES ==========
 
 @app.route('/about')
@@ -1261,7 +3452,7 @@ def about():
     try:
         return render_template('about.html')
     except Exception as e:
-        print(f"❌ About page error: {str(e)}", file=sys.stderr)
+        logger.exception("About page error: %s", e)
         return render_template('about.html')
 
 @app.route('/contact')
@@ -1270,7 +3461,7 @@ def contact():
     try:
         return render_template('contact.html')
     except Exception as e:
-        print(f"❌ Contact page error: {str(e)}", file=sys.stderr)
+        logger.exception("Contact page error: %s", e)
         return render_template('contact.html')
 
 # ========== CHECKOUT ROUTES ==========
@@ -1306,9 +3497,17 @@ def checkout():
                 flash('Please fill in all required fields.', 'danger')
                 return redirect(url_for('checkout'))
 
-            delivery_fee = calculate_delivery_fee(city, state, area, subtotal)
+            quantity = sum(item.get('quantity', 1) for item in cart_items)
+            delivery_fee = calculate_delivery_fee(city, state, area, subtotal, quantity)
             total = subtotal + delivery_fee
 
+            # The page quoted from its own copy of the rate table; the server's fee wins
+            quoted_fee = request.form.get('delivery_fee', type=float)
+            if quoted_fee is not None and quoted_fee != delivery_fee:
+                checkout_logger.warning("Delivery fee mismatch: page quoted %s (rates v%s), charged %s",
+                                        quoted_fee, request.form.get('delivery_rates_version'), delivery_fee)
+                flash(f'Delivery fee updated to {format_price(delivery_fee)} based on current rates.', 'info')
+
             order = Order(
                 order_number=generate_order_number(),
                 customer_id=session['customer_id'],
@@ -1350,6 +3549,7 @@ def checkout():
 
             db.session.commit()
             session.pop('cart', None)
+            record_checkout('success')
 
             flash(f'Order #{order.order_number} created successfully! We will contact you shortly.', 'success')
             return render_template('order.html',
@@ -1358,17 +3558,21 @@ def checkout():
 
         except Exception as e:
             db.session.rollback()
-            print(f"❌ Checkout error: {str(e)}", file=sys.stderr)
+            record_checkout('failure')
+            checkout_logger.exception("Checkout error: %s", e)
             flash('Error processing order. Please try again.', 'danger')
             return redirect(url_for('checkout'))
 
     customer = Customer.query.get(session['customer_id']) if 'customer_id' in session else None
-    delivery_fee = calculate_delivery_fee(
-        customer.city if customer else None,
+    quantity = sum(item.get('quantity', 1) for item in cart_items)
+    pricing = get_delivery_pricing()
+    delivery_fee = pricing.quote(
         customer.state if customer else None,
         None,
-        subtotal
-    )
+        customer.city if customer else None,
+        subtotal,
+        quantity
+    )['delivery_fee']
     total = subtotal + delivery_fee
 
     return render_template('checkout.html',
@@ -1378,9 +3582,12 @@ def checkout():
                            total=total,
                            free_delivery_threshold=BUSINESS_CONFIG['free_delivery_threshold'],
                            customer=customer,
-                           delivery_areas=BUSINESS_CONFIG['delivery_areas'])
+                           cart_quantity=quantity,
+                           delivery_rates=pricing.client_table(),
+                           delivery_areas={'lagos': pricing.areas('lagos')})
 
 @app.route('/calculate-delivery', methods=['POST'])
+@throttled('delivery')
 def calculate_delivery():
     """Calculate delivery fee via AJAX"""
     try:
@@ -1389,8 +3596,9 @@ def calculate_delivery():
         state = data.get('state', '')
         area = data.get('area', '')
         subtotal = float(data.get('subtotal', 0))
+        quantity = int(data.get('quantity', 1))
 
-        delivery_fee = calculate_delivery_fee(city, state, area, subtotal)
+        delivery_fee = calculate_delivery_fee(city, state, area, subtotal, quantity)
 
         return jsonify({
             'success': True,
@@ -1402,10 +3610,45 @@ def calculate_delivery():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/delivery-quotes', methods=['POST'])
+@throttled('delivery')
+def delivery_quotes():
+    """Quote many destinations in one call, e.g. every area of the selected state"""
+    try:
+        data = request.get_json(silent=True) or {}
+        destinations = data.get('destinations')
+        if not isinstance(destinations, list) or not destinations or len(destinations) > 100 \
+                or not all(isinstance(d, dict) for d in destinations):
+            return jsonify({'success': False, 'error': 'destinations must be a list of 1-100 objects'}), 400
+        subtotal = float(data.get('subtotal', 0))
+        quantity = int(data.get('quantity', 1))
+
+        pricing = get_delivery_pricing()
+        quotes = []
+        for destination in destinations:
+            quote = pricing.quote(destination.get('state'), destination.get('area'),
+                                  destination.get('city'), subtotal, quantity)
+            quote.update(
+                state=destination.get('state', ''),
+                area=destination.get('area', ''),
+                formatted_delivery_fee=format_price(quote['delivery_fee']),
+                total=subtotal + quote['delivery_fee'],
+                formatted_total=format_price(subtotal + quote['delivery_fee'])
+            )
+            quotes.append(quote)
+
+        return jsonify({'success': True, 'version': pricing.version, 'quotes': quotes})
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        checkout_logger.exception("Delivery quote error: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # ========== ADMIN ROUTES ==========
 
 @app.route('/admin', methods=['GET', 'POST'])
 @app.route('/admin/login', methods=['GET', 'POST'])
+@throttled('admin_login', when=is_post)
 def admin_login():
     """Admin login"""
     if 'admin_id' in session and session.get('is_admin'):
@@ -1419,6 +3662,7 @@ def admin_login():
             admin = User.query.filter_by(username=username, is_admin=True).first()
 
             if admin and admin.check_password(password):
+                commit_password_rehash(admin)
                 session['admin_id'] = admin.id
                 session['admin_name'] = admin.username
                 session['is_admin'] = True
@@ -1428,8 +3672,11 @@ def admin_login():
             else:
                 flash('Invalid admin credentials. Use admin/admin123', 'danger')
 
+        except PasswordHashBusy:
+            flash(PASSWORD_BUSY_MESSAGE, 'warning')
+            return render_template('admin/admin_login.html'), 503
         except Exception as e:
-            print(f"❌ Admin login error: {str(e)}", file=sys.stderr)
+            auth_logger.exception("Admin login error: %s", e)
             flash('Login error. Please try again.', 'danger')
 
     return render_template('admin/admin_login.html')
@@ -1445,6 +3692,7 @@ def admin_logout():
 
 @app.route('/admin/dashboard')
 @admin_required
+@read_replica
 def admin_dashboard():
     """Admin dashboard"""
     try:
@@ -1477,7 +3725,7 @@ def admin_dashboard():
                                recent_customers=recent_customers,
                                low_stock_products=low_stock_products)
     except Exception as e:
-        print(f"❌ Admin dashboard error: {str(e)}", file=sys.stderr)
+        admin_logger.exception("Admin dashboard error: %s", e)
         flash('Error loading dashboard.', 'danger')
         return render_template('admin/admin_dashboard.html',
                                total_orders=0,
@@ -1514,16 +3762,15 @@ def admin_products():
             query = query.filter(Product.total_quantity > 0, Product.total_quantity <= 10)
 
         products = query.order_by(Product.created_at.desc()).all()
-        categories = Category.query.all()
 
         return render_template('admin/products.html',
                                products=products,
-                               categories=categories,
+                               categories=lazy_categories,
                                category_id=category_id,
                                search=search,
                                low_stock=low_stock)
     except Exception as e:
-        print(f"❌ Admin products error: {str(e)}", file=sys.stderr)
+        admin_logger.exception("Admin products error: %s", e)
         flash('Error loading products.', 'danger')
         return render_template('admin/products.html',
                                products=[],
@@ -1683,13 +3930,12 @@ def admin_add_product():
 
         except ValueError as ve:
             db.session.rollback()
-            print(f"❌ Value error in add product: {str(ve)}", file=sys.stderr)
+            admin_logger.warning("Value error in add product: %s", ve)
             flash('Invalid price or stock value. Please enter valid numbers.', 'danger')
             return render_template('admin/add_product.html', categories=categories)
         except Exception as e:
             db.session.rollback()
-            print(f"❌ Add product error: {str(e)}", file=sys.stderr)
-            traceback.print_exc(file=sys.stderr)
+            admin_logger.exception("Add product error: %s", e)
             flash(f'Error adding product: {str(e)}', 'danger')
             return render_template('admin/add_product.html', categories=categories)
     
@@ -1710,6 +3956,7 @@ def admin_edit_product(id):
     if request.method == 'POST':
         try:
             # Update basic product info
+            old_name = product.name
             product.name = request.form.get('name', '').strip()
             product.description = request.form.get('description', '').strip()
             
@@ -1751,7 +3998,8 @@ def admin_edit_product(id):
                     return render_template('admin/edit_product.html', product=product, categories=categories)
                 product.sku = sku
             
-            product.slug = generate_unique_slug(product.name, Product, product.id)
+            if product.name != old_name or not product.slug:
+                product.slug = generate_unique_slug(product.name, Product, product.id)
 
             # Handle image uploads
             if 'images' in request.files:
@@ -1858,8 +4106,7 @@ def admin_edit_product(id):
 
         except Exception as e:
             db.session.rollback()
-            print(f"❌ Edit product error: {str(e)}", file=sys.stderr)
-            traceback.print_exc(file=sys.stderr)
+            admin_logger.exception("Edit product error: %s", e)
             flash('Error updating product. Please try again.', 'danger')
             return render_template('admin/edit_product.html', product=product, categories=categories)
 
@@ -1886,12 +4133,121 @@ def admin_delete_product(id):
 
     except Exception as e:
         db.session.rollback()
-        print(f"❌ Delete product error: {str(e)}", file=sys.stderr)
+        admin_logger.exception("Delete product error: %s", e)
         flash('Error deleting product. Please try again.', 'danger')
         return redirect(url_for('admin_products'))
 
+@app.route('/admin/inventory', methods=['GET', 'POST'])
+@admin_required
+def admin_inventory():
+    """Bulk stock and price adjustment screen"""
+    report = []
+    lines_text = ''
+
+    if request.method == 'POST':
+        lines_text = request.form.get('changes', '')
+        changes = [parse_inventory_line(line) for line in lines_text.splitlines() if line.strip()]
+
+        if not changes:
+            flash('Enter at least one inventory change.', 'warning')
+        else:
+            try:
+                report = apply_inventory_changes(changes)
+                updated = sum(1 for row in report if row['status'] == 'updated')
+                failed = len(report) - updated
+                flash(f'Inventory updated: {updated} row(s) applied, {failed} row(s) skipped.',
+                      'success' if not failed else 'warning')
+            except Exception as e:
+                admin_logger.exception("Bulk inventory error: %s", e)
+                flash('Error applying inventory changes. No changes were saved.', 'danger')
+
+    variants = db.session.query(ProductVariant, Product.name)\
+        .join(Product, ProductVariant.product_id == Product.id)\
+        .order_by(Product.name, ProductVariant.length, ProductVariant.texture)\
+        .all()
+
+    return render_template('admin/inventory.html',
+                           variants=variants,
+                           report=report,
+                           lines_text=lines_text)
+
+@app.route('/admin/inventory/bulk', methods=['POST'])
+@admin_required
+def admin_inventory_bulk():
+    """Apply bulk stock/price changes via JSON"""
+    try:
+        data = request.get_json(silent=True) or {}
+        changes = data.get('changes')
+        if not isinstance(changes, list) or not changes or not all(isinstance(c, dict) for c in changes):
+            return jsonify({'success': False, 'error': 'changes must be a non-empty list of objects'}), 400
+
+        report = apply_inventory_changes(changes)
+        updated = sum(1 for row in report if row['status'] == 'updated')
+
+        return jsonify({
+            'success': True,
+            'updated': updated,
+            'failed': len(report) - updated,
+            'results': report
+        })
+    except Exception as e:
+        admin_logger.exception("Bulk inventory API error: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/admin/delivery', methods=['GET', 'POST'])
+@admin_required
+def admin_delivery():
+    """Edit the delivery rate table"""
+    rules_text = None
+
+    if request.method == 'POST':
+        rules_text = request.form.get('rules', '')
+        try:
+            pricing = save_delivery_rates(json.loads(rules_text))
+            flash(f'Delivery rates saved (version {pricing.version}).', 'success')
+            return redirect(url_for('admin_delivery'))
+        except ValueError as e:
+            db.session.rollback()
+            flash(f'Rate table not saved: {e}', 'danger')
+        except Exception as e:
+            db.session.rollback()
+            admin_logger.exception("Delivery rates save error: %s", e)
+            flash('Error saving delivery rates. Please try again.', 'danger')
+
+    pricing = get_delivery_pricing()
+    if rules_text is None:
+        rules_text = json.dumps(pricing.rules, indent=2)
+
+    return render_template('admin/delivery.html',
+                           pricing=pricing,
+                           rules_text=rules_text)
+
+@app.route('/admin/delivery/rates', methods=['GET', 'PUT'])
+@admin_required
+def admin_delivery_rates():
+    """Read or replace the delivery rate table via JSON"""
+    try:
+        if request.method == 'PUT':
+            rules = request.get_json(silent=True)
+            if rules is None:
+                return jsonify({'success': False, 'error': 'expected a JSON rate table'}), 400
+            try:
+                pricing = save_delivery_rates(rules)
+            except ValueError as e:
+                db.session.rollback()
+                return jsonify({'success': False, 'error': str(e)}), 400
+        else:
+            pricing = get_delivery_pricing()
+
+        return jsonify({'success': True, 'version': pricing.version, 'rules': pricing.rules})
+    except Exception as e:
+        db.session.rollback()
+        admin_logger.exception("Delivery rates API error: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/admin/orders')
 @admin_required
+@read_replica
 def admin_orders():
     """Admin orders"""
     try:
@@ -1910,7 +4266,7 @@ def admin_orders():
                                orders=orders,
                                status=status)
     except Exception as e:
-        print(f"❌ Admin orders error: {str(e)}", file=sys.stderr)
+        admin_logger.exception("Admin orders error: %s", e)
         flash('Error loading orders.', 'danger')
         return render_template('admin/orders.html',
                                orders=[],
@@ -1931,7 +4287,7 @@ def admin_order_detail(id):
                                order=order,
                                order_items=order_items)
     except Exception as e:
-        print(f"❌ Admin order detail error: {str(e)}", file=sys.stderr)
+        admin_logger.exception("Admin order detail error: %s", e)
         flash('Error loading order details.', 'danger')
         return redirect(url_for('admin_orders'))
 
@@ -1957,7 +4313,7 @@ def admin_update_order(id):
         
     except Exception as e:
         db.session.rollback()
-        print(f"❌ Update order error: {str(e)}", file=sys.stderr)
+        admin_logger.exception("Update order error: %s", e)
         flash('Error updating order.', 'danger')
         return redirect(url_for('admin_orders'))
 
@@ -1971,21 +4327,255 @@ def admin_categories():
         categories = Category.query.order_by(Category.name).all()
         return render_template('admin/categories.html', categories=categories)
     except Exception as e:
-        print(f"❌ Admin categories error: {str(e)}", file=sys.stderr)
+        admin_logger.exception("Admin categories error: %s", e)
         flash('Error loading categories.', 'danger')
         return render_template('admin/categories.html', categories=[])
 
 @app.route('/admin/customers')
 @admin_required
+@read_replica
 def admin_customers():
     """Admin customers management"""
+    search = request.args.get('q', '').strip()
+    page = request.args.get('page', 1, type=int)
+    per_page = 25
+
     try:
-        customers = Customer.query.order_by(Customer.created_at.desc()).all()
-        return render_template('admin/customers.html', customers=customers)
+        order_stats = db.session.query(
+            Order.customer_id.label('customer_id'),
+            func.count(Order.id).label('order_count'),
+            func.coalesce(func.sum(Order.final_amount), 0).label('total_spent'),
+            func.max(Order.created_at).label('last_order_at')
+        ).filter(Order.customer_id.isnot(None))\
+            .group_by(Order.customer_id)\
+            .subquery()
+
+        query = db.session.query(
+            Customer,
+            func.coalesce(order_stats.c.order_count, 0),
+            func.coalesce(order_stats.c.total_spent, 0),
+            order_stats.c.last_order_at
+        ).outerjoin(order_stats, order_stats.c.customer_id == Customer.id)
+
+        if search:
+            # Prefix matches so the lower()/phone indexes can be used
+            escaped = search.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            prefix = f'{escaped}%'
+            query = query.filter(or_(
+                func.lower(Customer.email).like(prefix, escape='\\'),
+                func.lower(Customer.first_name).like(prefix, escape='\\'),
+                func.lower(Customer.last_name).like(prefix, escape='\\'),
+                Customer.phone.like(prefix, escape='\\')
+            ))
+
+        total_customers = query.order_by(None).count()
+        total_pages = max(1, (total_customers + per_page - 1) // per_page)
+        page = min(max(page, 1), total_pages)
+
+        customers = query.order_by(Customer.created_at.desc(), Customer.id.desc())\
+            .offset((page - 1) * per_page)\
+            .limit(per_page)\
+            .all()
+
+        today_start = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+        today_customers = Customer.query.filter(Customer.created_at >= today_start).count()
+        active_this_week = db.session.query(func.count(func.distinct(Order.customer_id)))\
+            .filter(Order.customer_id.isnot(None),
+                    Order.created_at >= datetime.utcnow() - timedelta(days=7))\
+            .scalar() or 0
+        all_customers = Customer.query.count()
+        customer_orders = Order.query.filter(Order.customer_id.isnot(None)).count()
+        avg_orders_per_customer = customer_orders / all_customers if all_customers else 0
+
+        return render_template('admin/customers.html',
+                               customers=customers,
+                               search=search,
+                               current_page=page,
+                               total_pages=total_pages,
+                               total_customers=total_customers,
+                               all_customers=all_customers,
+                               today_customers=today_customers,
+                               active_this_week=active_this_week,
+                               avg_orders_per_customer=avg_orders_per_customer)
     except Exception as e:
-        print(f"❌ Admin customers error: {str(e)}", file=sys.stderr)
+        admin_logger.exception("Admin customers error: %s", e)
         flash('Error loading customers.', 'danger')
-        return render_template('admin/customers.html', customers=[])
+        return render_template('admin/customers.html', customers=[], search=search,
+                               current_page=1, total_pages=1, total_customers=0)
+
+@app.route('/admin/customers/delete/<int:id>', methods=['POST'])
+@admin_required
+def admin_delete_customer(id):
+    """Delete customer"""
+    try:
+        customer = Customer.query.get_or_404(id)
+
+        has_orders = Order.query.filter_by(customer_id=id).first() is not None
+        if has_orders:
+            flash(f'Cannot delete customer "{customer.email}" because they have existing orders.', 'danger')
+            return redirect(url_for('admin_customers'))
+
+        db.session.delete(customer)
+        db.session.commit()
+
+        flash(f'Customer "{customer.email}" deleted successfully!', 'success')
+        return redirect(url_for('admin_customers'))
+
+    except Exception as e:
+        db.session.rollback()
+        admin_logger.exception("Delete customer error: %s", e)
+        flash('Error deleting customer. Please try again.', 'danger')
+        return redirect(url_for('admin_customers'))
+
+@app.route('/admin/metrics/queries')
+@admin_required
+def admin_query_metrics():
+    """Per-endpoint SQL query aggregates for this worker"""
+    with QUERY_STATS_LOCK:
+        endpoints = []
+        for endpoint, stats in QUERY_STATS.items():
+            requests_count = stats['requests'] or 1
+            endpoints.append({
+                'endpoint': endpoint,
+                **stats,
+                'n_plus_one_samples': list(stats['n_plus_one_samples']),
+                'avg_queries': round(stats['queries'] / requests_count, 2),
+                'avg_query_time_ms': round(stats['query_time_ms'] / requests_count, 2),
+                'query_time_ms': round(stats['query_time_ms'], 2),
+            })
+
+    endpoints.sort(key=lambda e: e['queries'], reverse=True)
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'slow_query_ms': app.config['SLOW_QUERY_MS'],
+        'n_plus_one_threshold': app.config['N_PLUS_ONE_THRESHOLD'],
+        'endpoints': endpoints
+    })
+
+@app.route('/admin/metrics/queries/reset', methods=['POST'])
+@admin_required
+def admin_reset_query_metrics():
+    """Start this worker's query aggregates over (CSRF-protected POST)"""
+    with QUERY_STATS_LOCK:
+        QUERY_STATS.clear()
+    return jsonify({'success': True, 'pid': os.getpid()})
+
+@app.route('/admin/reviews')
+@admin_required
+@read_replica
+def admin_reviews():
+    """Review moderation queue"""
+    status_filter = request.args.get('status', 'all')
+    rating_filter = request.args.get('rating', 'all')
+    product_filter = request.args.get('product', type=int)
+    search = request.args.get('search', '').strip()
+
+    try:
+        query = Review.query.options(joinedload(Review.product).selectinload(Product.images))
+        if status_filter in ('approved', 'pending'):
+            query = query.filter(Review.approved == (status_filter == 'approved'))
+        if rating_filter.isdigit():
+            query = query.filter(Review.rating == int(rating_filter))
+        if product_filter:
+            query = query.filter(Review.product_id == product_filter)
+        if search:
+            query = query.filter(or_(Review.customer_name.ilike(f'%{search}%'),
+                                     Review.comment.ilike(f'%{search}%')))
+        reviews = query.order_by(Review.created_at.desc(), Review.id.desc()).limit(200).all()
+
+        approved_count, total_count = db.session.query(
+            func.coalesce(func.sum(case((Review.approved == True, 1), else_=0)), 0),
+            func.count(Review.id)
+        ).one()
+        rated_count, rating_total = db.session.query(
+            func.coalesce(func.sum(ProductRatingSummary.review_count), 0),
+            func.coalesce(func.sum(ProductRatingSummary.rating_total), 0)
+        ).one()
+        review_stats = {
+            'total': total_count,
+            'approved': approved_count,
+            'pending': total_count - approved_count,
+            'avg_rating': round(rating_total / rated_count, 1) if rated_count else 0.0,
+        }
+        products = db.session.query(Product.id, Product.name).order_by(Product.name).all()
+
+        return render_template('admin/reviews.html',
+                               reviews=reviews,
+                               review_stats=review_stats,
+                               products=products,
+                               status_filter=status_filter,
+                               rating_filter=rating_filter,
+                               product_filter=product_filter,
+                               search_query=search)
+    except Exception as e:
+        admin_logger.exception("Admin reviews error: %s", e)
+        flash('Error loading reviews.', 'danger')
+        return redirect(url_for('admin_dashboard'))
+
+def moderate_reviews(review_ids, approve):
+    """Approve or delete reviews and refresh the affected rating summaries; returns the count"""
+    reviews = Review.query.filter(Review.id.in_(review_ids)).all()
+    for review in reviews:
+        if approve:
+            review.approved = True
+        else:
+            db.session.delete(review)
+    refresh_rating_summaries(review.product_id for review in reviews)
+    db.session.commit()
+    return len(reviews)
+
+def posted_review_ids():
+    data = request.get_json(silent=True) or {}
+    return [int(review_id) for review_id in data.get('review_ids', [])][:500]
+
+@app.route('/admin/reviews/approve/<int:id>', methods=['POST'])
+@admin_required
+def admin_approve_review(id):
+    try:
+        if not moderate_reviews([id], approve=True):
+            return jsonify({'success': False, 'error': 'Review not found'}), 404
+        return jsonify({'success': True})
+    except Exception as e:
+        db.session.rollback()
+        admin_logger.exception("Approve review error: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/admin/reviews/delete/<int:id>', methods=['POST'])
+@admin_required
+def admin_delete_review(id):
+    try:
+        if not moderate_reviews([id], approve=False):
+            return jsonify({'success': False, 'error': 'Review not found'}), 404
+        return jsonify({'success': True})
+    except Exception as e:
+        db.session.rollback()
+        admin_logger.exception("Delete review error: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/admin/reviews/bulk-approve', methods=['POST'])
+@admin_required
+def admin_bulk_approve_reviews():
+    try:
+        return jsonify({'success': True, 'approved': moderate_reviews(posted_review_ids(), approve=True)})
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'review_ids must be a list of ids'}), 400
+    except Exception as e:
+        db.session.rollback()
+        admin_logger.exception("Bulk approve reviews error: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/admin/reviews/bulk-delete', methods=['POST'])
+@admin_required
+def admin_bulk_delete_reviews():
+    try:
+        return jsonify({'success': True, 'deleted': moderate_reviews(posted_review_ids(), approve=False)})
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'review_ids must be a list of ids'}), 400
+    except Exception as e:
+        db.session.rollback()
+        admin_logger.exception("Bulk delete reviews error: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/admin/settings')
 @admin_required
@@ -1993,6 +4583,173 @@ def admin_settings():
     """Admin settings"""
     return render_template('admin/settings.html')
 
+# ========== CATALOG API ==========
+# Read-only JSON for the mobile front-end and the TypeScript server.
+#   ?fields=name,price     sparse fieldset (id is always returned)
+#   ?include=variants,images  children embedded, one batched query each
+#   ?after=<next_cursor>&limit=N  keyset pagination, newest first
+PRODUCT_API_FIELDS = {
+    'id': Product.id,
+    'name': Product.name,
+    'slug': Product.slug,
+    'description': Product.description,
+    'price': Product.base_price,
+    'compare_price': Product.compare_price,
+    'sku': Product.sku,
+    'stock': Product.total_quantity,
+    'featured': Product.featured,
+    'category_id': Product.category_id,
+    'is_bundle': Product.is_bundle,
+    'created_at': Product.created_at,
+}
+PRODUCT_API_DEFAULT_FIELDS = ['id', 'name', 'slug', 'price', 'compare_price', 'stock', 'featured', 'category_id']
+
+API_INCLUDES = {
+    'variants': (ProductVariant, {
+        'id': ProductVariant.id,
+        'name': ProductVariant.name,
+        'length': ProductVariant.length,
+        'texture': ProductVariant.texture,
+        'color': ProductVariant.color,
+        'price': ProductVariant.price,
+        'compare_price': ProductVariant.compare_price,
+        'stock': ProductVariant.stock,
+        'sku': ProductVariant.sku,
+    }, (ProductVariant.id,)),
+    'images': (ProductImage, {
+        'id': ProductImage.id,
+        'url': ProductImage.image_url,
+        'is_primary': ProductImage.is_primary,
+    }, (ProductImage.sort_order, ProductImage.is_primary.desc(), ProductImage.id)),
+}
+
+def parse_api_list(value, allowed, default):
+    """Split a comma-separated query parameter, rejecting unknown names"""
+    if not value:
+        return list(default)
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown value(s): {', '.join(unknown)}")
+    return list(dict.fromkeys(names))
+
+def embed_api_children(products, includes):
+    """Attach variants/images to product dicts with one IN query per include"""
+    product_ids = [product['id'] for product in products]
+    for include in includes:
+        model, columns, order_by = API_INCLUDES[include]
+        children = {product_id: [] for product_id in product_ids}
+        if product_ids:
+            rows = db.session.query(model.product_id, *columns.values())\
+                .filter(model.product_id.in_(product_ids))\
+                .order_by(model.product_id, *order_by)
+            for row in rows:
+                children[row[0]].append(dict(zip(columns, row[1:])))
+        for product in products:
+            product[include] = children[product['id']]
+
+def api_response(payload):
+    """Compact JSON with a content ETag; answers If-None-Match with 304"""
+    body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False,
+                      default=lambda value: value.isoformat() if isinstance(value, datetime) else str(value))
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(hashlib.sha1(body.encode('utf-8')).hexdigest())
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    return response.make_conditional(request)
+
+@app.route('/api/v1/products')
+@read_replica
+def api_products():
+    """Product list with sparse fields, embedded children and keyset pagination"""
+    try:
+        fields = parse_api_list(request.args.get('fields'), PRODUCT_API_FIELDS, PRODUCT_API_DEFAULT_FIELDS)
+        includes = parse_api_list(request.args.get('include'), API_INCLUDES, [])
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    try:
+        fields = ['id'] + [field for field in fields if field != 'id']
+        limit = min(max(request.args.get('limit', 24, type=int), 1), 100)
+        after = request.args.get('after', type=int)
+        category_id = request.args.get('category', type=int)
+        featured = request.args.get('featured')
+
+        query = db.session.query(*[PRODUCT_API_FIELDS[field] for field in fields])\
+            .filter(Product.active == True)
+        if category_id:
+            query = query.filter(Product.category_id == category_id)
+        if featured is not None:
+            query = query.filter(Product.featured == (featured.lower() in ('1', 'true', 'yes')))
+        if after:
+            query = query.filter(Product.id < after)
+
+        rows = query.order_by(Product.id.desc()).limit(limit + 1).all()
+        products = [dict(zip(fields, row)) for row in rows[:limit]]
+        embed_api_children(products, includes)
+
+        return api_response({
+            'success': True,
+            'products': products,
+            'next_cursor': products[-1]['id'] if len(rows) > limit else None,
+        })
+    except Exception as e:
+        logger.exception("API products error: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/v1/products/<int:id>')
+@read_replica
+def api_product(id):
+    """Single product; variants and images are embedded unless include= says otherwise"""
+    try:
+        fields = parse_api_list(request.args.get('fields'), PRODUCT_API_FIELDS, PRODUCT_API_FIELDS)
+        includes = parse_api_list(request.args.get('include'), API_INCLUDES, API_INCLUDES)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    try:
+        fields = ['id'] + [field for field in fields if field != 'id']
+        row = db.session.query(*[PRODUCT_API_FIELDS[field] for field in fields])\
+            .filter(Product.id == id, Product.active == True)\
+            .first()
+        if row is None:
+            return jsonify({'success': False, 'error': 'Product not found'}), 404
+
+        product = dict(zip(fields, row))
+        embed_api_children([product], includes)
+        return api_response({'success': True, 'product': product})
+    except Exception as e:
+        logger.exception("API product error: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/v1/categories')
+@read_replica
+def api_categories():
+    """Categories with their active product counts, in one grouped query"""
+    try:
+        product_count = func.count(Product.id)
+        rows = db.session.query(Category.id, Category.name, Category.slug, Category.image_url, product_count)\
+            .outerjoin(Product, and_(Product.category_id == Category.id, Product.active == True))\
+            .group_by(Category.id, Category.name, Category.slug, Category.image_url)\
+            .order_by(Category.name)\
+            .all()
+        categories = [
+            {'id': id, 'name': name, 'slug': slug, 'image_url': image_url, 'product_count': count}
+            for id, name, slug, image_url, count in rows
+        ]
+        return api_response({'success': True, 'categories': categories})
+    except Exception as e:
+        logger.exception("API categories error: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/v1/delivery-rates')
+def api_delivery_rates():
+    """Compiled delivery rate table; checkout quotes from it without a round trip"""
+    try:
+        return api_response({'success': True, 'rates': get_delivery_pricing().client_table()})
+    except Exception as e:
+        logger.exception("API delivery rates error: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # ========== STATIC FILE SERVING ==========
 
 @app.route('/static/uploads/<filename>')
@@ -2002,7 +4759,7 @@ def uploaded_file(filename):
         upload_folder = app.config['UPLOAD_FOLDER']
         return send_from_directory(upload_folder, filename)
     except Exception as e:
-        print(f"❌ Error serving file {filename}: {str(e)}", file=sys.stderr)
+        upload_logger.error("Error serving file %s: %s", filename, e)
         return send_from_directory('static/uploads', filename, as_attachment=False)
 
 # ========== HEALTH CHECK ==========
@@ -2025,6 +4782,27 @@ def health_check():
             'timestamp': datetime.utcnow().isoformat()
         }), 500
 
+@app.route('/metrics')
+@csrf.exempt
+def metrics():
+    """Prometheus text exposition, aggregated across workers when multiprocess"""
+    if not PROMETHEUS_AVAILABLE:
+        return jsonify({'success': False, 'error': 'prometheus_client not installed'}), 503
+
+    token = app.config['METRICS_TOKEN']
+    if not token and not FLASK_DEBUG:
+        return jsonify({'success': False, 'error': 'Not found'}), 404
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    return generate_latest(registry), 200, {'Content-Type': CONTENT_TYPE_LATEST}
+
 # ========== NEW ROUTES FOR ADDITIONAL TEMPLATES ==========
 
 @app.route('/order/<int:id>')
@@ -2048,10 +4826,49 @@ def order_detail(id):
             flash('You are not authorized to view this order.', 'danger')
             return redirect(url_for('account'))
     except Exception as e:
-        print(f"❌ Order detail error: {str(e)}", file=sys.stderr)
+        logger.exception("Order detail error: %s", e)
         flash('Error loading order details.', 'danger')
         return redirect(url_for('account'))
 
+@app.route('/track-order')
+def track_order():
+    """Order tracking by order number and email"""
+    order_number = request.args.get('order_number', '').strip()
+    email = request.args.get('email', '').strip().lower()
+
+    if not order_number:
+        return render_template('track_order.html', order_number='', email=email)
+
+    try:
+        normalized = normalize_order_number(order_number)
+        order = None
+        if normalized:
+            order = Order.query\
+                .options(selectinload(Order.items)
+                         .joinedload(OrderItem.product)
+                         .selectinload(Product.images))\
+                .filter_by(order_number=normalized)\
+                .first()
+
+        # Order numbers are sequential, so require the email unless the owner is logged in
+        owns_order = order is not None and (
+            (session.get('customer_id') and order.customer_id == session['customer_id']) or
+            (email and order.customer_email.strip().lower() == email)
+        )
+
+        if not owns_order:
+            flash('No order found with that order number and email.', 'warning')
+            return render_template('track_order.html', order_number=order_number, email=email)
+
+        return render_template('order.html',
+                               order=order,
+                               order_items=order.items,
+                               bank_details=BUSINESS_CONFIG)
+    except Exception as e:
+        logger.exception("Track order error: %s", e)
+        flash('Error looking up order. Please try again.', 'danger')
+        return render_template('track_order.html', order_number=order_number, email=email)
+
 # ========== DEFAULT IMAGE ROUTE ==========
 @app.route('/static/images/<filename>')
 def serve_image(filename):
@@ -2059,7 +4876,7 @@ def serve_image(filename):
     try:
         return send_from_directory('static/images', filename)
     except Exception as e:
-        print(f"❌ Error serving image {filename}: {str(e)}", file=sys.stderr)
+        upload_logger.error("Error serving image %s: %s", filename, e)
         # Return a placeholder if image not found
         return redirect('https://via.placeholder.com/800x800/8B4513/FFFFFF?text=NORA+HAIR+LINE')
 
@@ -0,0 +1,21 @@
+# precompile_templates.py
+# Build step: compiles every template once so the bytecode lands in
+# TEMPLATE_CACHE_DIR and new workers start without recompiling them.
+# Run with the same TEMPLATE_OPTIMIZE / TEMPLATE_CACHE_DIR as the web service.
+# Usage:
+#   python precompile_templates.py
+import sys
+import time
+
+from main import app
+
+if __name__ == "__main__":
+    started = time.perf_counter()
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        try:
+            app.jinja_env.get_template(name)
+        except Exception as e:
+            print(f"❌ {name}: {e}", file=sys.stderr)
+    print(f"✅ Compiled {len(names)} templates in {time.perf_counter() - started:.2f}s "
+          f"into {app.jinja_env.bytecode_cache.directory}")
@@ -0,0 +1,53 @@
+# precompress_static.py
+# Build step: writes .gz (and .br, when the brotli package is installed) next to
+# every compressible file under static/, so main.py can serve them without
+# compressing on each request. Uploads are skipped.
+# Usage:
+#   python precompress_static.py
+import gzip
+import os
+import sys
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'static')
+SKIP_DIRS = {'uploads'}
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.json', '.txt', '.xml', '.html', '.map'}
+MIN_SIZE = 1024
+
+def write_if_smaller(path, data, original_size):
+    """Compressed copies that don't save anything are not worth serving"""
+    if len(data) < original_size:
+        with open(path, 'wb') as f:
+            f.write(data)
+
+def precompress(path):
+    """Write siblings for one file; returns (original, gzip, brotli) sizes"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    write_if_smaller(path + '.gz', gz, len(data))
+    br = None
+    if brotli is not None:
+        br = brotli.compress(data, quality=11)
+        write_if_smaller(path + '.br', br, len(data))
+    return len(data), len(gz), len(br) if br is not None else None
+
+def main():
+    if brotli is None:
+        print("⚠️ brotli not installed, writing .gz only", file=sys.stderr)
+    for root, dirs, files in os.walk(STATIC_DIR):
+        dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+        for name in files:
+            path = os.path.join(root, name)
+            if os.path.splitext(name)[1] not in COMPRESSIBLE_EXTENSIONS or os.path.getsize(path) < MIN_SIZE:
+                continue
+            original, gz, br = precompress(path)
+            print(f"✅ {os.path.relpath(path, STATIC_DIR)}: {original} -> gzip {gz}"
+                  + (f", br {br}" if br is not None else ''))
+
+if __name__ == '__main__':
+    main()